@@ -0,0 +1,79 @@
+// Clientside rendering for the current-conditions gauges in
+// filterdashautomated.py. update_dashboard only ships the values in the
+// gauge-data store; emoji images are looked up by name in the emoji-cache
+// store sent with the page. Each gauge starts from GAUGE_SKELETON and only the
+// fields that change are replaced here, so Plotly.react can diff a handful of
+// properties instead of a fresh figure.
+
+(function () {
+    function withGauge(fig, g, maxAqi, emojis) {
+        var trace = fig.data[0];
+        var ann = fig.layout.annotations;
+        var x = g.spacing[0], dx = g.spacing[1], ax = g.spacing[2];
+        var aqiFont = g.spacing[3], deltaFont = g.spacing[4], arrowSize = g.spacing[5];
+
+        return {
+            data: [Object.assign({}, trace, {
+                visible: true,
+                value: g.aqi,
+                gauge: Object.assign({}, trace.gauge, {
+                    axis: Object.assign({}, trace.gauge.axis, {range: [0, maxAqi]}),
+                    bar: Object.assign({}, trace.gauge.bar, {color: g.bar_color})
+                })
+            })],
+            layout: Object.assign({}, fig.layout, {
+                annotations: [
+                    Object.assign({}, ann[0], {
+                        visible: true, x: x,
+                        text: "<b>AQI:" + g.aqi + "</b>",
+                        font: {size: aqiFont, color: "black"}
+                    }),
+                    Object.assign({}, ann[1], {
+                        visible: true, x: ax, y: g.delta !== 0 ? 0.24 : 0.26,
+                        text: g.arrow,
+                        font: {size: arrowSize, color: g.arrow_color}
+                    }),
+                    Object.assign({}, ann[2], {
+                        visible: g.delta !== 0, x: dx,
+                        text: g.delta_text,
+                        font: {size: deltaFont, color: g.arrow_color}
+                    }),
+                    Object.assign({}, ann[3], {visible: false})
+                ],
+                images: [Object.assign({}, fig.layout.images[0], {visible: true, source: emojis[g.emoji] || ""})]
+            })
+        };
+    }
+
+    function unavailable(fig) {
+        var ann = fig.layout.annotations;
+        return {
+            data: [Object.assign({}, fig.data[0], {visible: false})],
+            layout: Object.assign({}, fig.layout, {
+                annotations: [
+                    Object.assign({}, ann[0], {visible: false}),
+                    Object.assign({}, ann[1], {visible: false}),
+                    Object.assign({}, ann[2], {visible: false}),
+                    Object.assign({}, ann[3], {visible: true})
+                ],
+                images: [Object.assign({}, fig.layout.images[0], {visible: false})]
+            })
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        gauges: {
+            update: function (data, indoorFig, outdoorFig, emojis) {
+                if (!data) {
+                    return [unavailable(indoorFig), unavailable(outdoorFig), "N/A", "N/A"];
+                }
+                return [
+                    withGauge(indoorFig, data.indoor, data.max_aqi, emojis),
+                    withGauge(outdoorFig, data.outdoor, data.max_aqi, emojis),
+                    data.indoor.temp_text,
+                    data.outdoor.temp_text
+                ];
+            }
+        }
+    });
+})();
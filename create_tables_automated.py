@@ -49,6 +49,21 @@ def create_tables():
         timestamp TEXT,
         filter_state TEXT CHECK (filter_state IN ('ON','OFF'))
     );
+
+    -- Single-row mirror of the newest filter_state so readers do one rowid lookup
+    CREATE TABLE IF NOT EXISTS filter_state_latest (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        state_id INTEGER,
+        filter_state TEXT
+    );
+    CREATE TRIGGER IF NOT EXISTS filter_state_latest_sync
+    AFTER INSERT ON filter_state
+    BEGIN
+        INSERT OR REPLACE INTO filter_state_latest (id, state_id, filter_state)
+        VALUES (0, NEW.id, NEW.filter_state);
+    END;
+    INSERT OR IGNORE INTO filter_state_latest (id, state_id, filter_state)
+        SELECT 0, id, filter_state FROM filter_state ORDER BY id DESC LIMIT 1;
     
     CREATE TABLE IF NOT EXISTS Outdoor_One (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
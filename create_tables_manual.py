@@ -74,6 +74,20 @@ def create_tables():
         timestamp TEXT,
         filter_state TEXT CHECK (filter_state IN ('ON','OFF'))
     );
+    -- Single-row mirror of the newest filter_state so readers do one rowid lookup
+    CREATE TABLE IF NOT EXISTS filter_state_latest (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        state_id INTEGER,
+        filter_state TEXT
+    );
+    CREATE TRIGGER IF NOT EXISTS filter_state_latest_sync
+    AFTER INSERT ON filter_state
+    BEGIN
+        INSERT OR REPLACE INTO filter_state_latest (id, state_id, filter_state)
+        VALUES (0, NEW.id, NEW.filter_state);
+    END;
+    INSERT OR IGNORE INTO filter_state_latest (id, state_id, filter_state)
+        SELECT 0, id, filter_state FROM filter_state ORDER BY id DESC LIMIT 1;
     CREATE TABLE IF NOT EXISTS processed_events (
         processed_id INTEGER PRIMARY KEY AUTOINCREMENT,
         event_id INTEGER NOT NULL,
@@ -86,6 +100,7 @@ def create_tables():
         reminder_time TEXT NOT NULL,
         reminder_type TEXT NOT NULL
     );
+    CREATE INDEX IF NOT EXISTS idx_reminders_time ON reminders(reminder_time);
     CREATE TABLE IF NOT EXISTS baseline (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         timestamp TEXT,
@@ -1,7 +1,7 @@
-import time
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 import sqlite3
+from sapphires_db import open_db
 
 
 DATABASE_FILE_PATH = 'SAPPHIRESautomated.db' #Use the appropriate database for the state of the study
@@ -13,7 +13,7 @@ TABLES = ['Outdoor_One', 'Outdoor_Two', 'Outdoor_Three', 'Outdoor_Four']
 # Database Connection
 ###########################################################
 try:
-    connection = sqlite3.connect(DATABASE_FILE_PATH)
+    connection = open_db(DATABASE_FILE_PATH)
     cursor = connection.cursor()
 except sqlite3.Error as e:
     print(f"Error connecting to database: {str(e)}")
@@ -23,40 +23,30 @@ except sqlite3.Error as e:
 ###########################################################
 # Helper Functions
 ###########################################################
-def fetch_last_20_rows_columns(table_name):
+def fetch_window_stats(table_name):
     """
-    Fetch the last 20 rows of PM2.5 and timestamp from a specified table.
-    Returns lists of pm25_values and timestamp_values.
+    Summarize the last WINDOW_SIZE rows of PM2.5 from a specified table in one query.
+    Returns (count, min_pm25, max_pm25, oldest_timestamp) over the non-NULL readings,
+    which is all check_rising_edge needs to evaluate its all()-style conditions.
     """
-    pm25_values = []
-    timestamp_values = []
-
     try:
-        query = f"SELECT pm25, timestamp FROM {table_name} ORDER BY rowid DESC LIMIT 20"
+        query = f"""
+            SELECT COUNT(*), MIN(pm25), MAX(pm25), MIN(timestamp)
+            FROM (SELECT pm25, timestamp FROM {table_name} ORDER BY rowid DESC LIMIT {WINDOW_SIZE})
+            WHERE pm25 IS NOT NULL AND timestamp IS NOT NULL
+        """
         cursor.execute(query)
-        rows = cursor.fetchall()
-
-        for pm25_value, timestamp_str in rows:
-            if pm25_value is None:
-                continue
-
-            try:
-                timestamp_unix = time.mktime(datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S").timetuple())
-                pm25_values.append(pm25_value)
-                timestamp_values.append(timestamp_unix)
-            except (ValueError, TypeError):
-                continue
+        return cursor.fetchone()
 
     except sqlite3.Error as e:
         print(f"Database error while fetching data from {table_name}: {str(e)}")
-
-    return pm25_values, timestamp_values
+        return 0, None, None, None
 
 
 def read_baseline_value():
     """Read the baseline PM2.5 value from the database, defaulting to 7.5 on error."""
     try:
-        cursor.execute("SELECT baseline_value FROM baseline ORDER BY timestamp DESC LIMIT 1")
+        cursor.execute("SELECT baseline_value FROM baseline WHERE id = (SELECT MAX(id) FROM baseline)")
         rows = cursor.fetchall()
 
         if rows:
@@ -73,7 +63,7 @@ def read_baseline_value():
 def get_last_relay_state():
     """Fetch the most recent relay state from the filter_state table, defaulting to 'OFF' on error."""
     try:
-        cursor.execute("SELECT filter_state FROM filter_state ORDER BY id DESC LIMIT 1")
+        cursor.execute("SELECT filter_state FROM filter_state_latest WHERE id = 0")
         result = cursor.fetchone()
         return result[0] if result else 'OFF'
     except sqlite3.Error as e:
@@ -89,24 +79,22 @@ def check_rising_edge(table_name):
     global current_relay_state
 
     baseline_pm25 = read_baseline_value()
-    current_time = time.time()
-    one_hour_ago = current_time - 3600
+    # Timestamps are stored as '%Y-%m-%d %H:%M:%S' local time, which sorts as text
+    one_hour_ago = (datetime.now() - timedelta(hours=1)).isoformat(sep=" ", timespec="seconds")
 
-    pm25_values, timestamp_values = fetch_last_20_rows_columns(table_name)
+    count, min_pm25, max_pm25, oldest_timestamp = fetch_window_stats(table_name)
 
-    if len(pm25_values) >= WINDOW_SIZE and all(t >= one_hour_ago for t in timestamp_values):
+    if count >= WINDOW_SIZE and oldest_timestamp >= one_hour_ago:
         threshold = 1.25
-        if (current_relay_state == 'OFF'
-                and all(val > threshold * baseline_pm25 for val in pm25_values)):
+        if current_relay_state == 'OFF' and min_pm25 > threshold * baseline_pm25:
             current_relay_state = 'ON'
             print(f"{table_name}: PM2.5 is above threshold. Relay turned ON.")
-        elif (current_relay_state == 'ON'
-              and all(val <= baseline_pm25 for val in pm25_values)):
+        elif current_relay_state == 'ON' and max_pm25 <= baseline_pm25:
             current_relay_state = 'OFF'
             print(f"{table_name}: PM2.5 is at or below baseline. Relay turned OFF.")
     else:
         print(
-            f"{table_name}: Not enough data points ({len(pm25_values)} out of {WINDOW_SIZE}) or data too old. Skipping.")
+            f"{table_name}: Not enough data points ({count} out of {WINDOW_SIZE}) or data too old. Skipping.")
 
     insert_relay_state()
 
@@ -114,18 +102,13 @@ def check_rising_edge(table_name):
 def insert_relay_state():
     """Insert the relay state into the filter_state table."""
     try:
-        current_time_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        current_time_str = datetime.now().isoformat(sep=' ', timespec='seconds')
         cursor.execute('''
             INSERT INTO system_control (timestamp, system_input) 
             VALUES (?, ?)
         ''', (current_time_str, current_relay_state))
-        connection.commit()
     except sqlite3.Error as e:
         print(f"Database error during filter_state update: {str(e)}")
-        try:
-            connection.rollback()
-        except sqlite3.Error as rollback_error:
-            print(f"Rollback error: {rollback_error}")
 
 
 ###########################################################
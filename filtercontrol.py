@@ -1,16 +1,21 @@
 import paho.mqtt.client as mqtt
 import os
+import socket
 import sys
+import threading
 import time
+from types import SimpleNamespace
 import RPi.GPIO as GPIO
 
 
 MQTT_BROKER = "10.42.0.1"
 MQTT_PORT = 1883
 MQTT_TOPIC = "Filter"
+MQTT_CLIENT_ID = "sapphires_filter_ctl"
 
 
 GPIO_PIN = 18
+DEBOUNCE_SECONDS = 0.05
 STATE_FILE = "/home/ZeroWcontrol/gpio_state.txt" 
 
 def save_state(state):
@@ -24,62 +29,99 @@ def load_state():
         with open(STATE_FILE, "r") as f:
             return f.read().strip()
     return "OFF"  
-    
-last_message = load_state()
 
 def on_connect(client, userdata, flags, reason_code, properties):
     try:
-        client.subscribe(MQTT_TOPIC)
-        print("Connected and subscribed to topic")
+        # Turn off Nagle so PUBACKs for the hub's QoS 1 messages are not delayed
+        sock = client.socket()
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # The broker keeps our subscription between runs (clean_session=False), so
+        # only subscribe when it has no session for us. QoS 1 makes it queue any
+        # state change published while this script was not running.
+        if not flags.session_present:
+            client.subscribe(MQTT_TOPIC, qos=1)
+            print("Connected and subscribed to topic")
+        else:
+            print("Connected; resumed existing session")
     except Exception as e:
         print(f"Unexpected error in on_connect: {e}")
 
-def on_message(client, userdata, message):
-    global last_message
-    try:
-        new_message = message.payload.decode()
-    except UnicodeDecodeError as e:
-        print(f"Failed to decode message payload: {e}")
-        return
-
-    if new_message != last_message:
+def apply_state(userdata, new_message, timer):
+    """Drive the relay pin once a requested state has been stable for DEBOUNCE_SECONDS."""
+    with userdata.lock:
+        # timer may have fired just as on_message replaced it with a newer one;
+        # only the current timer drives the pin and clears pending.
+        if userdata.pending is not timer:
+            return
+        userdata.pending = None
+        if new_message == userdata.last:
+            return
         try:
             if new_message == "ON":
-                GPIO.output(GPIO_PIN, GPIO.HIGH)
-                print("GPIO 18 turned ON")
+                GPIO.output(userdata.pin, GPIO.HIGH)
+                print(f"GPIO {userdata.pin} turned ON")
             elif new_message == "OFF":
-                GPIO.output(GPIO_PIN, GPIO.LOW)
-                print("GPIO 18 turned OFF")
+                GPIO.output(userdata.pin, GPIO.LOW)
+                print(f"GPIO {userdata.pin} turned OFF")
             else:
                 print(f"Unknown message received: {new_message}")
 
            
             save_state(new_message)
-            last_message = new_message
+            userdata.last = new_message
         except RuntimeError as e:
             print(f"GPIO operation failed: {e}")
-    else:
-        print("No change in message, GPIO pin state remains unchanged")
+
+def on_message(client, userdata, message):
+    try:
+        new_message = message.payload.decode()
+    except UnicodeDecodeError as e:
+        print(f"Failed to decode message payload: {e}")
+        return
+
+    with userdata.lock:
+        # Any newer message supersedes one still waiting out the debounce window,
+        # so a state that flaps around the threshold never reaches the relay.
+        if userdata.pending is not None:
+            userdata.pending.cancel()
+            userdata.pending = None
+
+        if new_message != userdata.last:
+            timer = threading.Timer(DEBOUNCE_SECONDS, lambda: apply_state(userdata, new_message, timer))
+            userdata.pending = timer
+            timer.start()
+        else:
+            print("No change in message, GPIO pin state remains unchanged")
 
 if __name__ == "__main__":
+    # Callback state travels through paho's userdata instead of a module global
+    state = SimpleNamespace(last=load_state(), pin=GPIO_PIN, pending=None, lock=threading.Lock())
+
     try:
         GPIO.setwarnings(False)
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(GPIO_PIN, GPIO.OUT)
 
        
-        if last_message == "ON":
+        if state.last == "ON":
             GPIO.output(GPIO_PIN, GPIO.HIGH)
         else:
             GPIO.output(GPIO_PIN, GPIO.LOW)
 
-        print(f"Restored GPIO state: {last_message}")
+        print(f"Restored GPIO state: {state.last}")
 
     except RuntimeError as e:
         print(f"Failed to initialize GPIO: {e}")
         sys.exit(1)
 
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client = mqtt.Client(
+        mqtt.CallbackAPIVersion.VERSION2,
+        client_id=MQTT_CLIENT_ID,
+        clean_session=False
+    )
+    client.reconnect_delay_set(min_delay=1, max_delay=30)
+    client.user_data_set(state)
     client.on_connect = on_connect
     client.on_message = on_message
 
@@ -1,17 +1,34 @@
 import dash
 from dash import dcc, html, callback_context
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction, ALL
 import sqlite3
-import pandas as pd
+import numpy as np
 import plotly.graph_objs as go
-import datetime
+import time
 import base64
 import os
 import logging
+import threading
+import signal
+import sys
+from types import SimpleNamespace
+import queue
+import atexit
+import plotly.io as pio
+
+# Dash picks orjson up on its own when it is installed; point plotly's figure
+# serializer at it too so figures skip the pure-Python json encoder.
+try:
+    import orjson  # noqa: F401
+    pio.json.config.default_engine = "orjson"
+except ImportError:
+    pass
 
 
 DB_PATH = '/home/Mainhub/SAPPHIRESautomated.db'  
+# Same text format as every other timestamp column in the database
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 EXTERNAL_STYLESHEETS = [
     dbc.themes.BOOTSTRAP,
@@ -41,15 +58,131 @@ logging.basicConfig(
 logging.debug("Starting application with enhanced error handling.")
 
 
-def get_db_connection():
-    """Safely returns a connection to the SQLite DB or logs an error."""
+# SQL used by the callbacks. Each is a fixed string so sqlite3's per-connection
+# statement cache hands back the already-compiled statement on every call.
+GAUGE_WINDOW = 60
+OUTDOOR_TABLES = ("Outdoor_One", "Outdoor_Two", "Outdoor_Three", "Outdoor_Four")
+# Rows newer than the last one already in a table's rolling window, newest first
+NEW_READINGS_SQL = {
+    table: f"SELECT id, pm25, temperature FROM {table} WHERE id > ? ORDER BY id DESC LIMIT {GAUGE_WINDOW};"
+    for table in ("Indoor",) + OUTDOOR_TABLES
+}
+# Newest id in one table; used to notice a window whose rows have gone away
+MAX_ID_SQL = {table: f"SELECT MAX(id) FROM {table};" for table in NEW_READINGS_SQL}
+# Last 100 indoor rows, oldest first
+INDOOR_HISTORY_SQL = (
+    "SELECT timestamp, pm25 FROM "
+    "(SELECT id, timestamp, pm25 FROM Indoor ORDER BY id DESC LIMIT 100) ORDER BY id;"
+)
+# Last 60 rows from each outdoor sensor, averaged per timestamp across sensors
+OUTDOOR_HISTORY_SQL = (
+    "SELECT timestamp, AVG(pm25) FROM ("
+    + " UNION ALL ".join(
+        f"SELECT * FROM (SELECT timestamp, pm25 FROM Outdoor_{sensor} ORDER BY id DESC LIMIT 60)"
+        for sensor in ["One", "Two", "Three", "Four"]
+    )
+    + ") GROUP BY timestamp ORDER BY timestamp;"
+)
+# Newest id in every table the gauges read; changes whenever any of them gets a row
+DATA_VERSION_SQL = "SELECT " + ", ".join(
+    f"(SELECT MAX(id) FROM {table})" for table in NEW_READINGS_SQL
+) + ";"
+LAST_FAN_STATE_SQL = "SELECT user_input FROM user_control WHERE id = (SELECT MAX(id) FROM user_control);"
+INSERT_FAN_STATE_SQL = "INSERT INTO user_control (timestamp, user_input) VALUES (?, ?);"
+
+
+# Werkzeug's threaded server runs every callback on a new thread. When SQLite is
+# built in serialized mode they all share one connection, so its page cache and
+# statement cache stay warm across the 10 s refresh; otherwise each call opens
+# its own and _release_conn closes it.
+SHARE_CONNECTION = sqlite3.threadsafety == 3
+_shared_conn = None
+_shared_conn_lock = threading.Lock()
+
+def _open_conn(check_same_thread=not SHARE_CONNECTION):
+    conn = sqlite3.connect(
+        DB_PATH, isolation_level=None, check_same_thread=check_same_thread, cached_statements=256
+    )
+    conn.executescript(
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA temp_store=MEMORY;"
+        "PRAGMA cache_size=-8000;"
+    )
+    return conn
+
+def _get_conn():
+    """Safely returns the shared connection to the SQLite DB (or a new one) or logs an error."""
+    global _shared_conn
     try:
-        conn = sqlite3.connect(DB_PATH)
-        return conn
+        if not SHARE_CONNECTION:
+            return _open_conn()
+        if _shared_conn is None:
+            with _shared_conn_lock:
+                if _shared_conn is None:
+                    _shared_conn = _open_conn()
+        return _shared_conn
     except sqlite3.Error as e:
         logging.error(f"Error connecting to database at {DB_PATH}: {e}")
         return None
 
+def _release_conn(conn):
+    """Closes a connection from _get_conn() unless it is the shared one."""
+    if conn is not None and conn is not _shared_conn:
+        conn.close()
+
+def optimize_db():
+    """Lets SQLite refresh its query planner statistics; run once at startup."""
+    conn = _get_conn()
+    if not conn:
+        return
+    try:
+        conn.execute("PRAGMA optimize=0x10002;")
+    except sqlite3.Error as e:
+        logging.error(f"Error optimizing database at {DB_PATH}: {e}")
+    finally:
+        _release_conn(conn)
+
+
+# The last GAUGE_WINDOW pm25 readings per table, kept in a ring buffer so each
+# tick only has to fetch the rows inserted since the previous one.
+_windows = {
+    table: SimpleNamespace(buf=np.zeros(GAUGE_WINDOW), head=0, count=0, last_id=0, temperature=None)
+    for table in NEW_READINGS_SQL
+}
+_windows_lock = threading.Lock()
+
+def read_window(conn, table):
+    """
+    Bring table's rolling window up to date and return
+    (pm25 readings newest first, latest temperature).
+    The first call backfills the full window. Rows with a NULL pm25 or
+    temperature are skipped for that value. If the table's newest id drops
+    below the window's (rows deleted or the DB recreated), the window starts over.
+    """
+    w = _windows[table]
+    with _windows_lock:
+        rows = conn.execute(NEW_READINGS_SQL[table], (w.last_id,)).fetchall()
+        if not rows and w.last_id:
+            max_id = conn.execute(MAX_ID_SQL[table]).fetchone()[0]
+            if max_id is None or max_id < w.last_id:
+                logging.info(f"{table} newest id went back to {max_id}; refilling its window.")
+                w.head = w.count = w.last_id = 0
+                w.temperature = None
+                rows = conn.execute(NEW_READINGS_SQL[table], (0,)).fetchall()
+        for _, pm25, temperature in reversed(rows):
+            if temperature is not None:
+                w.temperature = temperature
+            if pm25 is None:
+                continue
+            w.buf[w.head] = pm25
+            w.head = (w.head + 1) % GAUGE_WINDOW
+            w.count = min(w.count + 1, GAUGE_WINDOW)
+        if rows:
+            w.last_id = rows[0][0]
+        newest_first = w.buf[(w.head - 1 - np.arange(w.count)) % GAUGE_WINDOW]
+        return newest_first, w.temperature
+
 
 def encode_image(image_path):
     """
@@ -67,23 +200,32 @@ def encode_image(image_path):
         logging.error(f"Error encoding image {image_path}: {e}")
         return ""
 
+# Emoji images never change while the app runs, so encode them once at startup.
+# They reach the browser once per page load through the emoji-cache store;
+# each gauge update only names which one to show.
+_EMOJI_URIS = {name: encode_image(path) for name, path in EMOJI_PATHS.items()}
+_EMOJI_BY_BUCKET = (
+    "good",
+    "moderate",
+    "unhealthy_sensitive",
+    "unhealthy",
+    "very_unhealthy",
+    "hazardous",
+)
+_GAUGE_COLOR_BY_BUCKET = ("green", "yellow", "orange", "#ff6600", "red", "#8b0000")
+
+def get_aqi_bucket(aqi):
+    """
+    Map an AQI value to its 25-point band: 0 for <=25, 1 for 26-50, ... 5 for >125.
+    """
+    return min(max((int(aqi) - 1) // 25, 0), 5)
+
 def get_aqi_emoji(aqi):
     """
-    Return a corresponding emoji image based on AQI value.
+    Return the EMOJI_PATHS key of the emoji image for an AQI value.
     """
     try:
-        if aqi <= 25:
-            return encode_image(EMOJI_PATHS["good"])
-        elif 26 <= aqi <= 50:
-            return encode_image(EMOJI_PATHS["moderate"])
-        elif 51 <= aqi <= 75:
-            return encode_image(EMOJI_PATHS["unhealthy_sensitive"])
-        elif 76 <= aqi <= 100:
-            return encode_image(EMOJI_PATHS["unhealthy"])
-        elif 101 <= aqi <= 125:
-            return encode_image(EMOJI_PATHS["very_unhealthy"])
-        else:
-            return encode_image(EMOJI_PATHS["hazardous"])
+        return _EMOJI_BY_BUCKET[get_aqi_bucket(aqi)]
     except Exception as e:
         logging.exception(f"Error selecting emoji for AQI {aqi}: {e}")
         return ""
@@ -92,130 +234,304 @@ def get_gauge_color(aqi):
     """
     Determine the gauge bar color based on AQI level.
     """
-    if aqi <= 25:
-        return "green"
-    elif 26 <= aqi <= 50:
-        return "yellow"
-    elif 51 <= aqi <= 75:
-        return "orange"
-    elif 76 <= aqi <= 100:
-        return "#ff6600"
-    elif 101 <= aqi <= 125:
-        return "red"
-    else:
-        return "#8b0000"
+    return _GAUGE_COLOR_BY_BUCKET[get_aqi_bucket(aqi)]
+
+# Lower edges of the AQI bands above "good", for bucketing whole arrays at once
+_AQI_BUCKET_EDGES = np.array([26, 51, 76, 101, 126])
+_GAUGE_COLORS = np.array(_GAUGE_COLOR_BY_BUCKET)
+# Marker color for a point with no reading (NULL pm25 in the database)
+_NO_DATA_COLOR = "grey"
+
+def bucket_colors(aqi_values):
+    """
+    Vectorized get_gauge_color: the band color for every value in aqi_values.
+    Values are rounded the way the gauge rounds them, so a point and the gauge
+    agree at a band edge. None becomes NaN and gets _NO_DATA_COLOR.
+    """
+    values = np.round(np.asarray(aqi_values, dtype=float))
+    colors = _GAUGE_COLORS[np.digitize(values, _AQI_BUCKET_EDGES)]
+    colors[np.isnan(values)] = _NO_DATA_COLOR
+    return colors.tolist()
 
 def get_last_fan_state():
     """
     Retrieve the last known fan state from the database: 'ON' or 'OFF'.
     Defaults to 'OFF' if no data or an error occurs.
     """
-    conn = None
+    conn = _get_conn()
+    if not conn:
+        logging.error("get_last_fan_state: No DB connection, returning 'OFF' as default.")
+        return "OFF"
     try:
-        conn = get_db_connection()
-        if not conn:
-            logging.error("get_last_fan_state: No DB connection, returning 'OFF' as default.")
-            return "OFF"
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_input FROM user_control ORDER BY id DESC LIMIT 1")
-        result = cursor.fetchone()
+        result = conn.execute(LAST_FAN_STATE_SQL).fetchone()
         return result[0] if result else "OFF"
     except Exception as e:
         logging.exception(f"Error fetching last fan state: {e}")
         return "OFF"
     finally:
-        if conn:
-            conn.close()
-
-def update_fan_state(state):
-    """
-    Update the fan state in the user_control table with 'ON' or 'OFF'.
-    """
-    conn = None
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        _release_conn(conn)
+
+# Fan state writes are handed to a single background writer so the button
+# callback never waits on a connect or fsync; writes that pile up within
+# FAN_WRITE_INTERVAL go to the DB in one transaction.
+FAN_WRITE_INTERVAL = 0.1
+FAN_WRITE_BATCH_MAX = 32
+_fan_writes = queue.SimpleQueue()
+# Queued last by stop_fan_writer; the writer finishes what is ahead of it and exits
+_FAN_STOP = object()
+_fan_conn = None
+
+def _write_fan_states(batch):
+    """Insert a batch of (timestamp, state) rows into user_control in one transaction."""
+    global _fan_conn
     try:
-        conn = get_db_connection()
-        if not conn:
-            logging.error(f"update_fan_state({state}): No DB connection, cannot update.")
-            return
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO user_control (timestamp, user_input) VALUES (?, ?)',
-            (timestamp, state)
-        )
-        conn.commit()
-        logging.info(f"Fan state updated to {state}.")
+        # The writer keeps a connection of its own, so its transaction never
+        # takes in reads the callbacks run on the shared one
+        if _fan_conn is None:
+            _fan_conn = _open_conn(check_same_thread=True)
+        conn = _fan_conn
+    except sqlite3.Error as e:
+        logging.error(f"_write_fan_states: No DB connection, dropping {len(batch)} fan state(s): {e}")
+        return
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(INSERT_FAN_STATE_SQL, batch)
+        conn.execute("COMMIT")
+        logging.info(f"Fan state updated to {batch[-1][1]}.")
     except Exception as e:
-        logging.exception(f"Error updating fan state to {state}: {e}")
+        logging.exception(f"Error writing fan state(s) {batch}: {e}")
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+
+def _drain_fan_writes(first):
+    """Collect first plus whatever else is queued, up to FAN_WRITE_BATCH_MAX rows or _FAN_STOP."""
+    batch = [first]
+    while len(batch) < FAN_WRITE_BATCH_MAX and batch[-1] is not _FAN_STOP:
+        try:
+            batch.append(_fan_writes.get(timeout=FAN_WRITE_INTERVAL))
+        except queue.Empty:
+            break
+    return batch
+
+def _fan_writer():
+    """Writes queued fan states until it reaches _FAN_STOP."""
+    try:
+        while True:
+            batch = _drain_fan_writes(_fan_writes.get())
+            stop = batch[-1] is _FAN_STOP
+            if stop:
+                batch.pop()
+            if batch:
+                _write_fan_states(batch)
+            if stop:
+                return
     finally:
-        if conn:
-            conn.close()
+        if _fan_conn is not None:
+            _fan_conn.close()
 
-def get_spacing(aqi, delta):
+_fan_writer_thread = threading.Thread(target=_fan_writer, name="fan-state-writer", daemon=True)
+_fan_writer_thread.start()
+
+@atexit.register
+def stop_fan_writer():
     """
-    Dynamically spaces the AQI & delta text and arrow.
+    Has the fan-state writer write everything queued, including a batch it has
+    already taken off the queue, then waits for it to exit. Runs at exit; the
+    SIGTERM handler in __main__ turns a SIGTERM into a normal exit so it still runs.
     """
-    aqi_digits = len(str(abs(aqi)))
-    delta_digits = len(str(abs(int(delta))))
+    if _fan_writer_thread.is_alive():
+        _fan_writes.put(_FAN_STOP)
+        _fan_writer_thread.join()
 
-    if delta == 0:
-        spacing_values = {
-            (1, 1): {"aqi_x_coord": 0.45, "delta_x_coord": 0.73, "arrow_coord": 0.654, "aqi_font": 30, "delta_font": 20,"arrow_size": 30},
-            (2, 1): {"aqi_x_coord": 0.45, "delta_x_coord": 0.76, "arrow_coord": 0.724, "aqi_font": 30, "delta_font": 20,"arrow_size": 30},
-            (3, 1): {"aqi_x_coord": 0.445, "delta_x_coord": 0.78, "arrow_coord": 0.755, "aqi_font": 30, "delta_font": 20,"arrow_size": 30},
-            (4, 1): {"aqi_x_coord": 0.445, "delta_x_coord": 0.81, "arrow_coord": 0.775, "aqi_font": 30,"delta_font": 20, "arrow_size": 30},
-        }
-    else:
-        spacing_values = {
-            (1, 1): {"aqi_x_coord": 0.43, "delta_x_coord": 0.73, "arrow_coord": 0.61, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (1, 2): {"aqi_x_coord": 0.42, "delta_x_coord": 0.74,"arrow_coord": 0.6, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (1, 3): {"aqi_x_coord": 0.4, "delta_x_coord": 0.775, "arrow_coord": 0.58, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (1, 4): {"aqi_x_coord": 0.375, "delta_x_coord": 0.79, "arrow_coord": 0.56, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (2, 1): {"aqi_x_coord": 0.43, "delta_x_coord": 0.76, "arrow_coord": 0.69, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (2, 2): {"aqi_x_coord": 0.415, "delta_x_coord": 0.775, "arrow_coord": 0.67, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (2, 3): {"aqi_x_coord": 0.4, "delta_x_coord": 0.8, "arrow_coord": 0.605, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (2, 4): {"aqi_x_coord": 0.38, "delta_x_coord": 0.81, "arrow_coord": 0.57, "aqi_font": 27, "delta_font": 20, "arrow_size": 29},
-            (3, 1): {"aqi_x_coord": 0.42, "delta_x_coord": 0.78, "arrow_coord": 0.71, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (3, 2): {"aqi_x_coord": 0.41, "delta_x_coord": 0.81, "arrow_coord": 0.7, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (3, 3): {"aqi_x_coord": 0.395, "delta_x_coord": 0.802, "arrow_coord": 0.608, "aqi_font": 27, "delta_font": 20, "arrow_size": 29},
-            (3, 4): {"aqi_x_coord": 0.37, "delta_x_coord": 0.82, "arrow_coord": 0.58, "aqi_font": 27, "delta_font": 20, "arrow_size": 29},
-            (4, 1): {"aqi_x_coord": 0.415, "delta_x_coord": 0.81, "arrow_coord": 0.735, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (4, 2): {"aqi_x_coord": 0.4, "delta_x_coord": 0.83, "arrow_coord": 0.72, "aqi_font": 30, "delta_font": 20, "arrow_size": 30},
-            (4, 3): {"aqi_x_coord": 0.38, "delta_x_coord": 0.83, "arrow_coord": 0.63, "aqi_font": 27, "delta_font": 20, "arrow_size": 29},
-            (4, 4): {"aqi_x_coord": 0.37, "delta_x_coord": 0.84, "arrow_coord": 0.6, "aqi_font": 26, "delta_font": 20, "arrow_size": 28},
-        }
+def update_fan_state(state, timestamp=None):
+    """
+    Queue the fan state ('ON' or 'OFF') for the user_control table,
+    stamped with timestamp or the current local time.
+    """
+    if timestamp is None:
+        timestamp = time.strftime(TIMESTAMP_FORMAT)
+    _fan_writes.put_nowait((timestamp, state))
+
+# Text/arrow placement for the gauge annotations, keyed by
+# (AQI digit count, delta digit count). Each value is
+# (aqi_x_coord, delta_x_coord, arrow_coord, aqi_font, delta_font, arrow_size).
+_SPACING_NO_DELTA = {
+    (1, 1): (0.45, 0.73, 0.654, 30, 20, 30),
+    (2, 1): (0.45, 0.76, 0.724, 30, 20, 30),
+    (3, 1): (0.445, 0.78, 0.755, 30, 20, 30),
+    (4, 1): (0.445, 0.81, 0.775, 30, 20, 30),
+}
 
-    key = (aqi_digits, delta_digits)
-    if key in spacing_values:
-        v = spacing_values[key]
-        return (
-            v["aqi_x_coord"],
-            v["delta_x_coord"],
-            v["arrow_coord"],
-            v["aqi_font"],
-            v["delta_font"],
-            v["arrow_size"]
-        )
-    else:
+_SPACING_WITH_DELTA = {
+    (1, 1): (0.43, 0.73, 0.61, 30, 20, 30),
+    (1, 2): (0.42, 0.74, 0.6, 30, 20, 30),
+    (1, 3): (0.4, 0.775, 0.58, 30, 20, 30),
+    (1, 4): (0.375, 0.79, 0.56, 30, 20, 30),
+    (2, 1): (0.43, 0.76, 0.69, 30, 20, 30),
+    (2, 2): (0.415, 0.775, 0.67, 30, 20, 30),
+    (2, 3): (0.4, 0.8, 0.605, 30, 20, 30),
+    (2, 4): (0.38, 0.81, 0.57, 27, 20, 29),
+    (3, 1): (0.42, 0.78, 0.71, 30, 20, 30),
+    (3, 2): (0.41, 0.81, 0.7, 30, 20, 30),
+    (3, 3): (0.395, 0.802, 0.608, 27, 20, 29),
+    (3, 4): (0.37, 0.82, 0.58, 27, 20, 29),
+    (4, 1): (0.415, 0.81, 0.735, 30, 20, 30),
+    (4, 2): (0.4, 0.83, 0.72, 30, 20, 30),
+    (4, 3): (0.38, 0.83, 0.63, 27, 20, 29),
+    (4, 4): (0.37, 0.84, 0.6, 26, 20, 28),
+}
+
+def _digit_count(value):
+    """Number of decimal digits in abs(int(value)), without going through str()."""
+    value = abs(int(value))
+    return 1 if value < 10 else 2 if value < 100 else 3 if value < 1000 else 4 if value < 10000 else 5
+
+def get_spacing(aqi, delta):
+    """
+    Dynamically spaces the AQI & delta text and arrow.
+    """
+    key = (_digit_count(aqi), _digit_count(delta))
+    spacing_values = _SPACING_NO_DELTA if delta == 0 else _SPACING_WITH_DELTA
+    try:
+        return spacing_values[key]
+    except KeyError:
         raise ValueError(
-            f"Invalid combination of aqi_length ({aqi_digits}) and delta_length ({delta_digits})."
+            f"Invalid combination of aqi_length ({key[0]}) and delta_length ({key[1]})."
         )
 
-def get_fallback_gauge():
-    """Return a minimal gauge figure if DB queries fail or data is missing."""
-    fig = go.Figure()
-    fig.add_annotation(text="Data Unavailable", x=0.5, y=0.5, showarrow=False, font=dict(size=16))
-    fig.update_layout(height=300, margin=dict(t=0, b=50, l=50, r=50))
-    return fig
+# Fully initialized gauge figure handed to both dcc.Graphs at layout time.
+# assets/gauges.js only rewrites the value, bar colour, annotation text and
+# positions, and emoji on this shape, so the order of the annotations matters:
+# AQI text, trend arrow, delta text, "Data Unavailable" placeholder.
+GAUGE_SKELETON = {
+    "data": [{
+        "type": "indicator",
+        "mode": "gauge",
+        "value": 0,
+        "gauge": {
+            "axis": {"range": [0, 100]},
+            "bar": {"color": "green"},
+            "bgcolor": "lightgray",
+            "bordercolor": "black",
+        },
+        "domain": {"x": [0, 1], "y": [0, 1]},
+        "visible": False,
+    }],
+    "layout": {
+        "height": 300,
+        "margin": {"t": 0, "b": 50, "l": 50, "r": 50},
+        "hovermode": False,
+        "annotations": [
+            {"x": 0.45, "y": 0.25, "text": "", "showarrow": False,
+             "font": {"size": 30, "color": "black"}, "xanchor": "center", "yanchor": "bottom"},
+            {"x": 0.654, "y": 0.26, "text": "", "showarrow": False,
+             "font": {"size": 30, "color": "grey"}},
+            {"x": 0.73, "y": 0.28, "text": "", "showarrow": False,
+             "font": {"size": 20, "color": "grey"}, "visible": False},
+            {"x": 0.5, "y": 0.5, "text": "Data Unavailable", "showarrow": False,
+             "font": {"size": 16}, "visible": False},
+        ],
+        "images": [{
+            "source": "",
+            "xref": "paper", "yref": "paper",
+            "x": 0.5, "y": 0.5,
+            "sizex": 0.2, "sizey": 0.2,
+            "xanchor": "center", "yanchor": "middle",
+            "visible": False,
+        }],
+    },
+}
 
+def get_gauge_values(aqi, delta, delta_text, arrow, arrow_color, temp_text):
+    """
+    Collect everything assets/gauges.js needs to draw one gauge.
+    """
+    x, dx, ax, aqi_font, delta_font, arrow_size = get_spacing(aqi, delta)
+    return {
+        "aqi": aqi,
+        "delta": delta,
+        "delta_text": delta_text,
+        "arrow": arrow,
+        "arrow_color": arrow_color,
+        "bar_color": get_gauge_color(aqi),
+        "emoji": get_aqi_emoji(aqi),
+        "spacing": [x, dx, ax, aqi_font, delta_font, arrow_size],
+        "temp_text": temp_text,
+    }
+
+
+# Fan button styles, built once. The fan is on while the button reads
+# "Disable Fan". Shared by every response, so never mutate them.
+_STYLE_ON = {
+    "width": "100px",
+    "height": "65px",
+    "border-radius": "100px",
+    "font-size": "1.2rem",
+    "color": "Yellow",
+    "backgroundColor": "red",
+    "border": "2px solid red"
+}
+_STYLE_OFF = {**_STYLE_ON, "backgroundColor": "green", "border": "2px solid green"}
+
+def fan_button(button_text):
+    """
+    Builds the fan control button for the given label.
+    """
+    return html.Button(
+        button_text,
+        id="disable-fan",
+        className="btn btn-danger btn-lg",
+        style=_STYLE_OFF if button_text == "Enable Fan" else _STYLE_ON
+    )
+
+def modal_button(text, action, class_name):
+    """
+    Builds a modal footer button. All of them share the 'modal-action' id type,
+    so one ALL-pattern input covers them whether or not their modal is mounted.
+    """
+    return dbc.Button(text, id={"type": "modal-action", "action": action}, className=class_name)
+
+def render_modals(modal_confirm, modal_warning, modal_notification):
+    """
+    Returns the children for modal-slot: only the modals that are open are
+    mounted, so closed ones add nothing to the page or to each callback round trip.
+    """
+    modals = []
+    if modal_confirm:
+        modals.append(dbc.Modal([
+            dbc.ModalHeader("Confirm Action", close_button=False),
+            dbc.ModalBody("Are you sure you want to disable the fan?"),
+            dbc.ModalFooter([
+                modal_button("Yes", "confirm-yes", "btn btn-primary"),
+                modal_button("No", "confirm-no", "btn btn-secondary")
+            ])
+        ], id="modal-confirm", is_open=True, backdrop="static", centered=True))
+    if modal_warning:
+        modals.append(dbc.Modal([
+            dbc.ModalHeader("Warning", style={'color': 'red'}, close_button=False),
+            dbc.ModalBody("Disabling the fan may affect air quality. Do you want to proceed?"),
+            dbc.ModalFooter([
+                modal_button("Proceed", "warning-yes", "btn btn-danger"),
+                modal_button("Cancel", "warning-no", "btn btn-secondary")
+            ])
+        ], id="modal-warning", is_open=True, backdrop="static", centered=True))
+    if modal_notification:
+        modals.append(dbc.Modal([
+            dbc.ModalHeader("Fan Enabled", close_button=False),
+            dbc.ModalBody(
+                "You have enabled the fan. The fan will start filtering the air and improving air quality. "
+                "You may now close this window."
+            ),
+            dbc.ModalFooter(modal_button("Close", "close-notification", "btn btn-secondary"))
+        ], id="modal-notification", is_open=True, backdrop="static", centered=True))
+    return modals
 
 def dashboard_layout():
     """
     Constructs the main dashboard layout with all modals/buttons.
+    The fan button itself depends on the DB, so it is left to render_fan_button
+    and this tree can be built once at startup.
     """
-    last_state = get_last_fan_state()
-    button_text = "Enable Fan" if last_state == "OFF" else "Disable Fan"
-
     return dbc.Container([
         dbc.Row([
             dbc.Col(
@@ -283,7 +599,7 @@ def dashboard_layout():
                 html.Div([
                     # AQI gauge
                     html.Div([
-                        dcc.Graph(id="indoor-gauge", config={"displayModeBar": False})
+                        dcc.Graph(id="indoor-gauge", figure=GAUGE_SKELETON, config={"displayModeBar": False, "staticPlot": True})
                     ], style={
                         "padding": "0",
                         "border": "2px solid black",
@@ -353,7 +669,7 @@ def dashboard_layout():
                                }),
                 html.Div([
                     html.Div([
-                        dcc.Graph(id="outdoor-gauge", config={"displayModeBar": False})
+                        dcc.Graph(id="outdoor-gauge", figure=GAUGE_SKELETON, config={"displayModeBar": False, "staticPlot": True})
                     ], style={
                         "padding": "0",
                         "border": "2px solid black",
@@ -412,20 +728,7 @@ def dashboard_layout():
         # Fan Control Button & modals
         dbc.Row([
             html.Div(
-                html.Button(
-                    button_text,
-                    id="disable-fan",
-                    className="btn btn-danger btn-lg",
-                    style={
-                        "width": "100px",
-                        "height": "65px",
-                        "border-radius": "100px",
-                        "font-size": "1.2rem",
-                        "color": "Yellow",
-                        "backgroundColor": "green" if button_text == "Enable Fan" else "red",
-                        "border": "2px solid green" if button_text == "Enable Fan" else "2px solid red"
-                    }
-                ),
+                id="fan-button-slot",
                 style={
                     "border": "2px solid black",
                     "padding": "5px",
@@ -449,95 +752,68 @@ def dashboard_layout():
         dcc.Store(id='modal-state-store',
                   data={'modal_confirm': False, 'modal_warning': False, 'modal_notification': False}),
 
-        # Confirmation Modal
-        dbc.Modal([
-            dbc.ModalHeader("Confirm Action", close_button=False),
-            dbc.ModalBody("Are you sure you want to disable the fan?"),
-            dbc.ModalFooter([
-                dbc.Button("Yes", id="confirm-yes", className="btn btn-primary"),
-                dbc.Button("No", id="confirm-no", className="btn btn-secondary")
-            ])
-        ], id="modal-confirm", is_open=False, backdrop="static", centered=True),
-
-        # Warning Modal
-        dbc.Modal([
-            dbc.ModalHeader("Warning", style={'color': 'red'}, close_button=False),
-            dbc.ModalBody("Disabling the fan may affect air quality. Do you want to proceed?"),
-            dbc.ModalFooter([
-                dbc.Button("Proceed", id="warning-yes", className="btn btn-danger"),
-                dbc.Button("Cancel", id="warning-no", className="btn btn-secondary")
-            ])
-        ], id="modal-warning", is_open=False, backdrop="static", centered=True),
-
-        # Notification Modal (Fan Enabled)
-        dbc.Modal([
-            dbc.ModalHeader("Fan Enabled", close_button=False),
-            dbc.ModalBody(
-                "You have enabled the fan. The fan will start filtering the air and improving air quality. "
-                "You may now close this window."
-            ),
-            dbc.ModalFooter(dbc.Button("Close", id="close-notification", className="btn btn-secondary"))
-        ], id="modal-notification", is_open=False, backdrop="static", centered=True),
+        # Open modals are mounted here by manage_fan_workflow
+        html.Div(id="modal-slot", children=[]),
 
         dcc.Interval(id='interval-component', interval=10 * 1000, n_intervals=0),
+        dcc.Store(id='data-version'),
+        dcc.Store(id='gauge-data'),
+        dcc.Store(id='emoji-cache', data=_EMOJI_URIS, storage_type='memory'),
         dcc.Store(id='workflow-state', data={'stage': 'initial'})
     ], fluid=True, className="p-4")
 
 
+# The current-conditions tree never changes, so build it once
+DASHBOARD_LAYOUT = dashboard_layout()
+
 def historical_conditions_layout():
     
+    # Timestamps stay as the 'YYYY-MM-DD HH:MM:SS' strings SQLite stores;
+    # Plotly reads those as dates on its own.
+    indoor_x, indoor_y, outdoor_x, outdoor_y = [], [], [], []
+    # None leaves the markers at the trace's default color
+    indoor_colors = outdoor_colors = None
     conn = None
     try:
-        conn = get_db_connection()
-        indoor_data = pd.read_sql("SELECT timestamp, pm25 FROM Indoor ORDER BY id DESC LIMIT 100;", conn)
-        # Retrieve outdoor data from each sensor and average them by timestamp
-        outdoor_dfs = []
-        for sensor in ["One", "Two", "Three", "Four"]:
-            df = pd.read_sql(f"SELECT timestamp, pm25 FROM Outdoor_{sensor} ORDER BY id DESC LIMIT 60;", conn)
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                outdoor_dfs.append(df)
-
-        if outdoor_dfs:
-            all_outdoor = pd.concat(outdoor_dfs)
-            outdoor_data = all_outdoor.groupby('timestamp', as_index=False)['pm25'].mean().sort_values('timestamp')
-        else:
-            outdoor_data = pd.DataFrame(columns=['timestamp', 'pm25'])
+        conn = _get_conn()
+        rows = conn.execute(INDOOR_HISTORY_SQL).fetchall()
+        if rows:
+            indoor_x, indoor_y = (list(col) for col in zip(*rows))
+            indoor_colors = bucket_colors(indoor_y)
+        rows = conn.execute(OUTDOOR_HISTORY_SQL).fetchall()
+        if rows:
+            outdoor_x, outdoor_y = (list(col) for col in zip(*rows))
+            outdoor_colors = bucket_colors(outdoor_y)
     except Exception as e:
         logging.exception(f"Error retrieving historical data: {e}")
-        indoor_data = pd.DataFrame(columns=["timestamp", "pm25"])
-        outdoor_data = pd.DataFrame(columns=["timestamp", "pm25"])
     finally:
-        if conn:
-            conn.close()
+        _release_conn(conn)
 
-    if not indoor_data.empty:
-        indoor_data['timestamp'] = pd.to_datetime(indoor_data['timestamp'])
-    else:
+    if not indoor_x:
         logging.warning("No indoor data found for historical layout.")
 
-    if not outdoor_data.empty:
-        outdoor_data['timestamp'] = pd.to_datetime(outdoor_data['timestamp'])
-    else:
+    if not outdoor_x:
         logging.warning("No outdoor data found for historical layout.")
 
     fig = go.Figure()
-    if not indoor_data.empty:
-        fig.add_trace(go.Scatter(
-            x=indoor_data['timestamp'],
-            y=indoor_data['pm25'],
-            mode='lines',
+    if indoor_x:
+        fig.add_trace(go.Scattergl(
+            x=indoor_x,
+            y=indoor_y,
+            mode='lines+markers',
+            marker=dict(color=indoor_colors, size=5),
             name='Indoor PM',
-            line=dict(color='red', width=2, shape='spline'),
+            line=dict(color='red', width=2, shape='linear'),
             hoverinfo='x+y',
         ))
-    if not outdoor_data.empty:
-        fig.add_trace(go.Scatter(
-            x=outdoor_data['timestamp'],
-            y=outdoor_data['pm25'],
-            mode='lines',
+    if outdoor_x:
+        fig.add_trace(go.Scattergl(
+            x=outdoor_x,
+            y=outdoor_y,
+            mode='lines+markers',
+            marker=dict(color=outdoor_colors, size=5),
             name='Outdoor PM',
-            line=dict(color='blue', width=2, shape='spline'),
+            line=dict(color='blue', width=2, shape='linear'),
             hoverinfo='x+y',
         ))
 
@@ -561,6 +837,8 @@ def historical_conditions_layout():
             tickfont=dict(size=12)
         ),
         template="plotly_white",
+        hovermode="x unified",
+        uirevision="static",
         legend=dict(
             orientation="h",
             x=0.5,
@@ -667,7 +945,7 @@ app.index_string = '''
 def display_page(pathname):
     """Switches between dashboard and historical layout."""
     if pathname == '/':
-        return dashboard_layout()
+        return DASHBOARD_LAYOUT
     elif pathname == '/historical':
         return historical_conditions_layout()
     else:
@@ -675,61 +953,70 @@ def display_page(pathname):
 
 
 @app.callback(
-    [
-        Output('indoor-gauge', 'figure'),
-        Output('outdoor-gauge', 'figure'),
-        Output('indoor-temp-display', 'children'),
-        Output('outdoor-temp-display', 'children')
-    ],
-    [Input('interval-component', 'n_intervals')]
+    Output('fan-button-slot', 'children'),
+    Input('url', 'pathname'),
 )
-def update_dashboard(n):
+def render_fan_button(pathname):
+    """Fills in the fan button from the last saved fan state when the dashboard is shown."""
+    last_state = get_last_fan_state()
+    return fan_button("Enable Fan" if last_state == "OFF" else "Disable Fan")
+
+
+@app.callback(
+    Output('data-version', 'data'),
+    [Input('interval-component', 'n_intervals')],
+    [State('data-version', 'data')]
+)
+def poll_data_version(n_intervals, current_version):
     """
-    Periodically fetches the latest indoor/outdoor data from the database,
-    updates the gauge figures and temp displays.
+    Runs on every interval tick. Reads a version string built from the newest
+    row id in each sensor table and only bumps data-version (and so only calls
+    update_dashboard) when a reading has actually arrived.
     """
+    version = None
+    conn = _get_conn()
     try:
-        conn = get_db_connection()
+        if conn:
+            version = ":".join(str(v) for v in conn.execute(DATA_VERSION_SQL).fetchone())
     except Exception as e:
-        logging.exception(f"update_dashboard: DB connection failed: {e}")
-        return get_fallback_gauge(), get_fallback_gauge(), "N/A", "N/A"
+        logging.exception(f"Error reading data version: {e}")
+    finally:
+        _release_conn(conn)
+    if version is None or version == current_version:
+        return dash.no_update
+    return version
+
 
+@app.callback(
+    Output('gauge-data', 'data'),
+    [Input('data-version', 'data')]
+)
+def update_dashboard(version):
+    """
+    Fetches the latest indoor/outdoor data from the database whenever the
+    data version changes and publishes the handful of values the gauges need
+    into the gauge-data store.
+    The figures themselves are drawn client-side by assets/gauges.js.
+    """
+    conn = _get_conn()
     if conn is None:
         logging.error("update_dashboard: Could not get DB connection (conn is None).")
-        return get_fallback_gauge(), get_fallback_gauge(), "N/A", "N/A"
+        return None
 
     try:
-        indoor_temp_df = None
-        indoor_pm = None
-        outdoor_pm = 0  
-        outdoor_temp_df = 0  
-        indoor_temp_df = pd.read_sql("SELECT temperature FROM Indoor ORDER BY id DESC LIMIT 60;", conn)
-        indoor_pm = pd.read_sql("SELECT pm25 FROM Indoor ORDER BY id DESC LIMIT 60;", conn)
-        
-        outdoor_pm_values = []
-        for i in ["One", "Two", "Three", "Four"]:
-            outdoor_pm_df = pd.read_sql(f"SELECT pm25 FROM Outdoor_{i} ORDER BY id DESC LIMIT 60;", conn)
-            if not outdoor_pm_df.empty:
-                outdoor_pm_values.append(outdoor_pm_df['pm25'].mean())
-
-        if outdoor_pm_values:
-            outdoor_pm = sum(outdoor_pm_values) / len(outdoor_pm_values)
-        else:
-            outdoor_pm = 0  #
+        indoor_pm, indoor_temp = read_window(conn, "Indoor")
 
+        outdoor_pm_values = []
         outdoor_temp_values = []
-        for i in ["One", "Two", "Three", "Four"]:
-            outdoor_temp_df = pd.read_sql(f"SELECT temperature FROM Outdoor_{i} ORDER BY id DESC LIMIT 1;", conn)
-            if not outdoor_temp_df.empty:
-                outdoor_temp_values.append(outdoor_temp_df['temperature'].iloc[0])
-
-        if outdoor_temp_values:
-            outdoor_temp_df = sum(outdoor_temp_values) / len(outdoor_temp_values)
-        else:
-            outdoor_temp_df = 0  
-
-        conn.close()
+        for table in OUTDOOR_TABLES:
+            pm, temperature = read_window(conn, table)
+            if pm.size:
+                outdoor_pm_values.append(pm.mean())
+            if temperature is not None:
+                outdoor_temp_values.append(temperature)
 
+        outdoor_pm = sum(outdoor_pm_values) / len(outdoor_pm_values) if outdoor_pm_values else 0
+        outdoor_temp = sum(outdoor_temp_values) / len(outdoor_temp_values) if outdoor_temp_values else None
 
         indoor_aqi = 0
         outdoor_aqi = 0
@@ -745,10 +1032,10 @@ def update_dashboard(n):
         outdoor_delta_text = "0"
 
         # Indoor
-        if not indoor_pm is None:
-            indoor_aqi = round(indoor_pm['pm25'].iloc[0])
-            if len(indoor_pm) > 30:
-                indoor_delta = indoor_aqi - round(indoor_pm['pm25'].iloc[30:].mean())
+        if indoor_pm.size:
+            indoor_aqi = round(float(indoor_pm[0]))
+            if indoor_pm.size > 30:
+                indoor_delta = indoor_aqi - round(float(indoor_pm[30:].mean()))
             indoor_delta_text = f"+{indoor_delta}" if indoor_delta > 0 else str(indoor_delta)
             if indoor_delta > 0:
                 indoor_arrow = "⬆️"
@@ -760,145 +1047,62 @@ def update_dashboard(n):
                 indoor_arrow = "--"
                 indoor_arrow_color = "grey"
 
-        if not indoor_temp_df.empty:
-            indoor_temp_value = round(indoor_temp_df['temperature'].iloc[0], 1)
+        if indoor_temp is not None:
+            indoor_temp_value = round(indoor_temp, 1)
             indoor_temp_text = f"{indoor_temp_value} °F"
 
         # Outdoor
-        if not outdoor_pm is None :
-            outdoor_aqi = round(outdoor_pm)
-            if len(str(outdoor_pm)) > 30:
-                outdoor_delta = outdoor_aqi - round(outdoor_pm)
-            outdoor_delta_text = f"+{outdoor_delta}" if outdoor_delta > 0 else str(outdoor_delta)
-            if outdoor_delta > 0:
-                outdoor_arrow = "⬆️"
-                outdoor_arrow_color = "red"
-            elif outdoor_delta < 0:
-                outdoor_arrow = "⬇️"
-                outdoor_arrow_color = "green"
-            else:
-                outdoor_arrow = "--"
-                outdoor_arrow_color = "grey"
+        outdoor_aqi = round(float(outdoor_pm))
+        outdoor_delta_text = str(outdoor_delta)
 
-        if not outdoor_temp_df is None:
-            outdoor_temp_value = round(outdoor_temp_df, 1)
+        if outdoor_temp is not None:
+            outdoor_temp_value = round(outdoor_temp, 1)
             outdoor_temp_text = f"{outdoor_temp_value} °F"
 
-        max_aqi = max(indoor_aqi, outdoor_aqi, 100)
-        indoor_emoji = get_aqi_emoji(indoor_aqi)
-        outdoor_emoji = get_aqi_emoji(outdoor_aqi)
-        # Build Indoor gauge
-        indoor_x, indoor_dx, indoor_ax, indoor_aqi_font, indoor_delta_font, indoor_arrow_size = get_spacing(indoor_aqi, indoor_delta)
-        indoor_fig = go.Figure(go.Indicator(
-            mode="gauge",
-            value=indoor_aqi,
-            gauge={
-                'axis': {'range': [0, max_aqi]},
-                'bar': {'color': get_gauge_color(indoor_aqi)},
-                'bgcolor': "lightgray",
-                'bordercolor': "black",
-            },
-            domain={'x': [0, 1], 'y': [0, 1]}
-        ))
-        indoor_fig.update_layout(height=300, margin=dict(t=0, b=50, l=50, r=50))
-        indoor_fig.add_annotation(
-            x=indoor_x, y=0.25,
-            text=f"<b>AQI:{indoor_aqi}</b>",
-            showarrow=False,
-            font=dict(size=indoor_aqi_font, color="black"),
-            xanchor="center", yanchor="bottom"
-        )
-        indoor_fig.add_annotation(
-            x=indoor_ax, y=0.24 if indoor_delta != 0 else 0.26,
-            text=indoor_arrow,
-            font=dict(size=indoor_arrow_size, color=indoor_arrow_color),
-            showarrow=False
-        )
-        indoor_fig.add_layout_image(
-            dict(
-                source=indoor_emoji,
-                xref="paper", yref="paper",
-                x=0.5, y=0.5,
-                sizex=0.2, sizey=0.2,
-                xanchor="center", yanchor="middle"
-            )
-        )
-        if indoor_delta != 0:
-            indoor_fig.add_annotation(
-                x=indoor_dx, y=0.28,
-                text=indoor_delta_text,
-                font=dict(size=indoor_delta_font, color=indoor_arrow_color),
-                showarrow=False
-            )
-
-        # Build Outdoor gauge
-        outdoor_x, outdoor_dx, outdoor_ax, outdoor_aqi_font, outdoor_delta_font, outdoor_arrow_size = get_spacing(outdoor_aqi, outdoor_delta)
-        outdoor_fig = go.Figure(go.Indicator(
-            mode="gauge",
-            value=outdoor_aqi,
-            gauge={
-                'axis': {'range': [0, max_aqi]},
-                'bar': {'color': get_gauge_color(outdoor_aqi)},
-                'bgcolor': "lightgray",
-                'bordercolor': "black",
-            },
-            domain={'x': [0, 1], 'y': [0, 1]}
-        ))
-        outdoor_fig.update_layout(height=300, margin=dict(t=0, b=50, l=50, r=50))
-        outdoor_fig.add_annotation(
-            x=outdoor_x, y=0.25,
-            text=f"<b>AQI:{outdoor_aqi}</b>",
-            showarrow=False,
-            font=dict(size=outdoor_aqi_font, color="black"),
-            xanchor="center", yanchor="bottom"
-        )
-        outdoor_fig.add_annotation(
-            x=outdoor_ax, y=0.24 if outdoor_delta != 0 else 0.26,
-            text=outdoor_arrow,
-            font=dict(size=outdoor_arrow_size, color=outdoor_arrow_color),
-            showarrow=False
-        )
-        outdoor_fig.add_layout_image(
-            dict(
-                source=outdoor_emoji,
-                xref="paper", yref="paper",
-                x=0.5, y=0.5,
-                sizex=0.2, sizey=0.2,
-                xanchor="center", yanchor="middle"
-            )
-        )
-        if outdoor_delta != 0:
-            outdoor_fig.add_annotation(
-                x=outdoor_dx, y=0.28,
-                text=outdoor_delta_text,
-                font=dict(size=outdoor_delta_font, color=outdoor_arrow_color),
-                showarrow=False
-            )
-
-
-        return indoor_fig, outdoor_fig, indoor_temp_text, outdoor_temp_text
+        return {
+            "max_aqi": max(indoor_aqi, outdoor_aqi, 100),
+            "indoor": get_gauge_values(indoor_aqi, indoor_delta, indoor_delta_text,
+                                       indoor_arrow, indoor_arrow_color, indoor_temp_text),
+            "outdoor": get_gauge_values(outdoor_aqi, outdoor_delta, outdoor_delta_text,
+                                        outdoor_arrow, outdoor_arrow_color, outdoor_temp_text),
+        }
 
     except Exception as ex:
         logging.exception(f"Error in update_dashboard callback: {ex}")
-        return get_fallback_gauge(), get_fallback_gauge(), "N/A", "N/A"
+        return None
+    finally:
+        _release_conn(conn)
+
+
+# Updates both gauge figures in the browser from the gauge-data store, so only
+# a few scalars cross the wire every tick instead of two serialized figures.
+app.clientside_callback(
+    ClientsideFunction(namespace='gauges', function_name='update'),
+    [
+        Output('indoor-gauge', 'figure'),
+        Output('outdoor-gauge', 'figure'),
+        Output('indoor-temp-display', 'children'),
+        Output('outdoor-temp-display', 'children')
+    ],
+    [Input('gauge-data', 'data')],
+    [
+        State('indoor-gauge', 'figure'),
+        State('outdoor-gauge', 'figure'),
+        State('emoji-cache', 'data')
+    ]
+)
 
 
 @app.callback(
     [
         Output('disable-fan', 'children'),
         Output('disable-fan', 'style'),
-        Output('modal-confirm', 'is_open'),
-        Output('modal-warning', 'is_open'),
-        Output('modal-notification', 'is_open'),
+        Output('modal-slot', 'children'),
         Output('modal-state-store', 'data')
     ],
     [
         Input('disable-fan', 'n_clicks'),
-        Input('confirm-yes', 'n_clicks'),
-        Input('confirm-no', 'n_clicks'),
-        Input('warning-yes', 'n_clicks'),
-        Input('warning-no', 'n_clicks'),
-        Input('close-notification', 'n_clicks')
+        Input({'type': 'modal-action', 'action': ALL}, 'n_clicks')
     ],
     [
         State('disable-fan', 'children'),
@@ -906,31 +1110,27 @@ def update_dashboard(n):
     ],
     prevent_initial_call=True
 )
-def manage_fan_workflow(disable_fan_clicks, confirm_yes_clicks, confirm_no_clicks,
-                        warning_yes_clicks, warning_no_clicks, close_notification_clicks,
-                        button_text, modal_state):
+def manage_fan_workflow(disable_fan_clicks, modal_action_clicks, button_text, modal_state):
     """
     Manages the fan enabling/disabling workflow and modal states.
+    State changes are queued for the fan-state writer with update_fan_state.
     """
+    triggered = callback_context.triggered
+    # A modal button that was just mounted reports n_clicks=None; that is not a click
+    if not triggered or not triggered[0]['value']:
+        return (dash.no_update,) * 4
+
     try:
-        triggered_id = callback_context.triggered[0]['prop_id'].split('.')[0] if callback_context.triggered else None
+        triggered_id = callback_context.triggered_id
+        if isinstance(triggered_id, dict):
+            triggered_id = triggered_id['action']
 
         modal_confirm = modal_state.get('modal_confirm', False)
         modal_warning = modal_state.get('modal_warning', False)
         modal_notification = modal_state.get('modal_notification', False)
 
         is_fan_on = (button_text == "Disable Fan")
-
-        # Default button style
-        button_style = {
-            "width": "100px",
-            "height": "65px",
-            "border-radius": "100px",
-            "font-size": "1.2rem",
-            "color": "Yellow",
-            "backgroundColor": "red" if is_fan_on else "green",
-            "border": "2px solid red" if is_fan_on else "2px solid green"
-        }
+        button_style = _STYLE_ON if is_fan_on else _STYLE_OFF
 
         if triggered_id == 'disable-fan' and is_fan_on:
             # Fan is ON, user wants to disable -> confirm
@@ -950,8 +1150,7 @@ def manage_fan_workflow(disable_fan_clicks, confirm_yes_clicks, confirm_no_click
             modal_warning = False
             update_fan_state("OFF")
             button_text = "Enable Fan"
-            button_style["backgroundColor"] = "green"
-            button_style["border"] = "2px solid green"
+            button_style = _STYLE_OFF
 
         elif triggered_id == 'warning-no':
             modal_warning = False
@@ -961,8 +1160,7 @@ def manage_fan_workflow(disable_fan_clicks, confirm_yes_clicks, confirm_no_click
             update_fan_state("ON")
             modal_notification = True
             button_text = "Disable Fan"
-            button_style["backgroundColor"] = "red"
-            button_style["border"] = "2px solid red"
+            button_style = _STYLE_ON
 
         elif triggered_id == 'close-notification':
             modal_notification = False
@@ -973,31 +1171,30 @@ def manage_fan_workflow(disable_fan_clicks, confirm_yes_clicks, confirm_no_click
             'modal_notification': modal_notification
         }
 
-        return button_text, button_style, modal_confirm, modal_warning, modal_notification, updated_state
+        return (button_text, button_style, render_modals(modal_confirm, modal_warning, modal_notification),
+                updated_state)
 
     except Exception as ex:
         logging.exception(f"Error in manage_fan_workflow callback: {ex}")
         # On error, revert to current states so we don't break UI
         return (
             button_text,
-            {
-                "width": "100px",
-                "height": "65px",
-                "border-radius": "100px",
-                "font-size": "1.2rem",
-                "color": "Yellow",
-                "backgroundColor": "red" if (button_text == "Disable Fan") else "green",
-                "border": "2px solid red" if (button_text == "Disable Fan") else "2px solid green"
-            },
-            modal_state.get('modal_confirm', False),
-            modal_state.get('modal_warning', False),
-            modal_state.get('modal_notification', False),
+            _STYLE_ON if (button_text == "Disable Fan") else _STYLE_OFF,
+            render_modals(
+                modal_state.get('modal_confirm', False),
+                modal_state.get('modal_warning', False),
+                modal_state.get('modal_notification', False)
+            ),
             modal_state
         )
 
+
 ###################################################
 # MAIN
 ###################################################
 
 if __name__ == '__main__':
+    # SIGTERM would otherwise end the process without running stop_fan_writer
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    optimize_db()
     app.run_server(debug=False)
@@ -3,9 +3,12 @@ from dash import dcc, html, callback_context
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 import sqlite3
+import threading
 import datetime
 import os
 import base64
+import functools
+from contextlib import closing
 import pandas as pd
 import plotly.graph_objs as go
 import logging
@@ -60,26 +63,80 @@ def get_db_connection():
         logging.error(f"Database connection error: {e}")
         raise
 
+# Dash serves callbacks from several threads. When SQLite is built in serialized
+# mode they can all share one read connection (and its warm page cache).
+SHARE_READ_CONNECTION = sqlite3.threadsafety == 3
+_read_conn = None
+_read_conn_lock = threading.Lock()
+
+def _open_read_connection():
+    conn = sqlite3.connect(
+        DB_PATH, timeout=5, isolation_level=None, check_same_thread=not SHARE_READ_CONNECTION
+    )
+    conn.executescript(
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA optimize=0x10002;"
+        "PRAGMA query_only=1;"
+        "PRAGMA cache_size=-4000;"
+        "PRAGMA mmap_size=67108864;"
+    )
+    return conn
+
+def get_read_connection():
+    """
+    Returns the autocommit, query-only connection used by the read-only helpers below.
+    With isolation_level=None the sqlite3 module issues no implicit BEGIN/COMMIT,
+    so each SELECT runs as its own statement without extra transaction bookkeeping.
+    The connection is opened once and shared across callback threads; callers
+    hand it back with release_read_connection(). Logs and re-raises on error.
+    """
+    global _read_conn
+    try:
+        if not SHARE_READ_CONNECTION:
+            return _open_read_connection()
+        if _read_conn is None:
+            with _read_conn_lock:
+                if _read_conn is None:
+                    _read_conn = _open_read_connection()
+        return _read_conn
+    except sqlite3.Error as e:
+        logging.error(f"Database connection error: {e}")
+        raise
+
+def release_read_connection(conn):
+    """
+    Closes a connection from get_read_connection() unless it is the shared one.
+    """
+    if conn is not None and conn is not _read_conn:
+        conn.close()
+
 ###################################################
 # HELPER FUNCTIONS
 ###################################################
 
+PNG_DATA_URI_PREFIX = b"data:image/png;base64,"
+
+@functools.lru_cache(maxsize=64)
 def encode_image(image_path):
     """
     Returns a base64-encoded string of the image at image_path.
     Logs a warning if file does not exist or can't be read.
+    The emoji files are static, so each path is read and encoded once.
     """
     if not os.path.exists(image_path):
         logging.warning(f"Image file not found: {image_path}")
         return ""
     try:
         with open(image_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode("ascii")
-        return f"data:image/png;base64,{encoded}"
+            return b"".join((PNG_DATA_URI_PREFIX, base64.b64encode(f.read()))).decode("ascii")
     except Exception as e:
         logging.error(f"Error encoding image {image_path}: {e}")
         return ""
 
+# Warm the cache so the first dashboard render doesn't touch the disk
+for _path in EMOJI_PATHS.values():
+    encode_image(_path)
+
 def get_aqi_emoji(aqi):
     """
     Return a corresponding emoji image based on AQI value.
@@ -184,13 +241,14 @@ def get_fallback_gauge():
 
 def get_last_filter_state():
     """
-    Returns (id, filter_state) of the most recent entry in filter_state.
+    Returns (id, filter_state) of the most recent entry in filter_state,
+    read from the single-row filter_state_latest mirror.
     """
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT id, filter_state FROM filter_state ORDER BY id DESC LIMIT 1')
+        cursor.execute('SELECT state_id, filter_state FROM filter_state_latest WHERE id = 0')
         result = cursor.fetchone()
         if not result:
             logging.info("No rows found in filter_state table; returning OFF as default.")
@@ -203,8 +261,7 @@ def get_last_filter_state():
         logging.exception(f"Unexpected error in get_last_filter_state: {ex}")
         return (None, "OFF")
     finally:
-        if conn:
-            conn.close()
+        release_read_connection(conn)
 
 def get_last_system_state():
     """
@@ -212,9 +269,9 @@ def get_last_system_state():
     """
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT id, system_input FROM system_control ORDER BY id DESC LIMIT 1')
+        cursor.execute('SELECT id, system_input FROM system_control WHERE id = (SELECT MAX(id) FROM system_control)')
         result = cursor.fetchone()
         if not result:
             logging.info("No rows found in system_control table; returning OFF as default.")
@@ -227,8 +284,7 @@ def get_last_system_state():
         logging.exception(f"Unexpected error in get_last_system_state: {ex}")
         return (None, "OFF")
     finally:
-        if conn:
-            conn.close()
+        release_read_connection(conn)
 
 def is_event_processed(event_id):
     """
@@ -238,7 +294,7 @@ def is_event_processed(event_id):
         return True  # If there's no event_id, consider it "processed" or non-existent
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT event_id FROM processed_events WHERE event_id=?', (event_id,))
         result = cursor.fetchone()
@@ -250,8 +306,7 @@ def is_event_processed(event_id):
         logging.exception(f"Unexpected error in is_event_processed: {ex}")
         return False
     finally:
-        if conn:
-            conn.close()
+        release_read_connection(conn)
 
 def record_event_as_processed(event_id, action):
     """
@@ -259,27 +314,21 @@ def record_event_as_processed(event_id, action):
     """
     if event_id is None:
         return
-    conn = None
     try:
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            '''
-            INSERT INTO processed_events (event_id, action, processed_timestamp)
-            VALUES (?, ?, ?)
-            ''',
-            (event_id, action, timestamp)
-        )
-        conn.commit()
+        with closing(get_db_connection()) as conn, conn:
+            conn.execute(
+                '''
+                INSERT INTO processed_events (event_id, action, processed_timestamp)
+                VALUES (?, ?, ?)
+                ''',
+                (event_id, action, timestamp)
+            )
         logging.info(f"Successfully recorded event {event_id} with action '{action}'")
     except sqlite3.Error as e:
         logging.error(f"Database error while recording event {event_id}: {e}")
     except Exception as ex:
         logging.exception(f"Unexpected error in record_event_as_processed for event {event_id}: {ex}")
-    finally:
-        if conn:
-            conn.close()
 
 def add_reminder(event_id, delay_minutes, reminder_type):
     """
@@ -287,23 +336,17 @@ def add_reminder(event_id, delay_minutes, reminder_type):
     """
     if event_id is None:
         return
-    conn = None
     try:
         reminder_time = (datetime.datetime.now() + datetime.timedelta(minutes=delay_minutes)).strftime("%Y-%m-%d %H:%M:%S")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO reminders (event_id, reminder_time, reminder_type) VALUES (?,?,?)',
-            (event_id, reminder_time, reminder_type)
-        )
-        conn.commit()
+        with closing(get_db_connection()) as conn, conn:
+            conn.execute(
+                'INSERT INTO reminders (event_id, reminder_time, reminder_type) VALUES (?,?,?)',
+                (event_id, reminder_time, reminder_type)
+            )
     except sqlite3.Error as e:
         logging.error(f"Error adding reminder for event {event_id}: {e}")
     except Exception as ex:
         logging.exception(f"Unexpected error in add_reminder: {ex}")
-    finally:
-        if conn:
-            conn.close()
 
 def get_due_reminder():
     """
@@ -312,7 +355,7 @@ def get_due_reminder():
     conn = None
     try:
         current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor()
         logging.debug(f"Checking for due reminders at {current_time}")
         cursor.execute(
@@ -332,8 +375,7 @@ def get_due_reminder():
         logging.error(f"Error in get_due_reminder: {e}")
         return (None, None)
     finally:
-        if conn:
-            conn.close()
+        release_read_connection(conn)
 
 def remove_reminder(reminder_id):
     """
@@ -341,38 +383,26 @@ def remove_reminder(reminder_id):
     """
     if reminder_id is None:
         return
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM reminders WHERE reminder_id=?', (reminder_id,))
-        conn.commit()
+        with closing(get_db_connection()) as conn, conn:
+            conn.execute('DELETE FROM reminders WHERE reminder_id=?', (reminder_id,))
     except sqlite3.Error as e:
         logging.error(f"Error removing reminder {reminder_id}: {e}")
     except Exception as ex:
         logging.exception(f"Unexpected error in remove_reminder: {ex}")
-    finally:
-        if conn:
-            conn.close()
 
 def update_user_control_decision(state):
     """
     Inserts a new row into user_control with 'ON' or 'OFF'.
     """
-    conn = None
     try:
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO user_control (timestamp, user_input) VALUES (?,?)', (timestamp, state))
-        conn.commit()
+        with closing(get_db_connection()) as conn, conn:
+            conn.execute('INSERT INTO user_control (timestamp, user_input) VALUES (?,?)', (timestamp, state))
     except sqlite3.Error as e:
         logging.error(f"Error updating user_control to {state}: {e}")
     except Exception as ex:
         logging.exception(f"Unexpected error in update_user_control_decision: {ex}")
-    finally:
-        if conn:
-            conn.close()
 
 ###################################################
 # LAYOUTS
@@ -741,16 +771,15 @@ def historical_conditions_layout():
     """
     conn = None
     try:
-        conn = get_db_connection()
-        indoor_data = pd.read_sql("SELECT timestamp, pm25 FROM Indoor ORDER BY timestamp DESC LIMIT 100;", conn)
-        outdoor_data = pd.read_sql("SELECT timestamp, pm25 FROM Outdoor ORDER BY timestamp DESC LIMIT 100;", conn)
+        conn = get_read_connection()
+        indoor_data = pd.read_sql("SELECT timestamp, pm25 FROM Indoor ORDER BY id DESC LIMIT 100;", conn)
+        outdoor_data = pd.read_sql("SELECT timestamp, pm25 FROM Outdoor ORDER BY id DESC LIMIT 100;", conn)
     except Exception as e:
         logging.exception(f"Error retrieving historical data: {e}")
         indoor_data = pd.DataFrame(columns=["timestamp", "pm25"])
         outdoor_data = pd.DataFrame(columns=["timestamp", "pm25"])
     finally:
-        if conn:
-            conn.close()
+        release_read_connection(conn)
 
     if not indoor_data.empty:
         indoor_data['timestamp'] = pd.to_datetime(indoor_data['timestamp'])
@@ -913,7 +942,7 @@ def update_dashboard(n):
     updates the gauge figures and temp displays.
     """
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
     except Exception as e:
         logging.exception(f"update_dashboard: DB connection failed: {e}")
         return get_fallback_gauge(), get_fallback_gauge(), "N/A", "N/A"
@@ -924,11 +953,11 @@ def update_dashboard(n):
 
     try:
        
-        indoor_pm = pd.read_sql("SELECT pm25 FROM Indoor ORDER BY timestamp DESC LIMIT 60;", conn)
-        outdoor_pm = pd.read_sql("SELECT pm25 FROM Outdoor ORDER BY timestamp DESC LIMIT 60;", conn)
-        indoor_temp_df = pd.read_sql("SELECT temperature FROM Indoor ORDER BY timestamp DESC LIMIT 1;", conn)
-        outdoor_temp_df = pd.read_sql("SELECT temperature FROM Outdoor ORDER BY timestamp DESC LIMIT 1;", conn)
-        conn.close()
+        indoor_pm = pd.read_sql("SELECT pm25 FROM Indoor ORDER BY id DESC LIMIT 60;", conn)
+        outdoor_pm = pd.read_sql("SELECT pm25 FROM Outdoor ORDER BY id DESC LIMIT 60;", conn)
+        indoor_temp_df = pd.read_sql("SELECT temperature FROM Indoor WHERE id = (SELECT MAX(id) FROM Indoor);", conn)
+        outdoor_temp_df = pd.read_sql("SELECT temperature FROM Outdoor WHERE id = (SELECT MAX(id) FROM Outdoor);", conn)
+        release_read_connection(conn)
 
   
         indoor_aqi = 0
@@ -1,39 +1,126 @@
 import sqlite3
 import datetime
 import logging
+import os
+import atexit
+import socket
 import time
 from typing import Optional, Tuple
+import paho.mqtt.client as mqtt
+from sapphires_db import open_db
 
 DB_PATH = '/home/Mainhub/SAPPHIRESautomated.db'  
+BROKER_ADDRESS = "10.42.0.1"
+MQTT_SOCKET_PATH = "/run/mosquitto/mqtt.sock"
+MQTT_TOPIC = "Filter"
+
+# Fixed SQL text for every statement, so the connection's statement cache
+# always hits. get_last_state only accepts the (table, column) pairs listed here.
+LAST_STATE_SQL = {
+    ('user_control', 'user_input'): 'SELECT id, user_input FROM user_control WHERE id = (SELECT MAX(id) FROM user_control)',
+    ('system_control', 'system_input'): 'SELECT id, system_input FROM system_control WHERE id = (SELECT MAX(id) FROM system_control)',
+    ('filter_state', 'filter_state'): 'SELECT id, filter_state FROM filter_state WHERE id = (SELECT MAX(id) FROM filter_state)',
+}
+# Both latest states in one statement, for the per-tick decision
+LAST_STATES_SQL = (
+    'SELECT (SELECT user_input FROM user_control WHERE id = (SELECT MAX(id) FROM user_control)), '
+    '(SELECT system_input FROM system_control WHERE id = (SELECT MAX(id) FROM system_control))'
+)
+INSERT_FILTER_STATE_SQL = 'INSERT INTO filter_state (timestamp, filter_state) VALUES (?, ?)'
 logging.basicConfig(
     filename='insert_filter_state.log',
     level=logging.DEBUG,
     format='%(asctime)s [%(levelname)s] %(message)s'
 )
 
-def get_db_connection() -> sqlite3.Connection:
+_CONN: Optional[sqlite3.Connection] = None
 
+def get_db_connection() -> sqlite3.Connection:
+    """
+    Returns the module's single SQLite connection, opening it on first use.
+    It is in autocommit mode and reused for every read and write until exit.
+    Logs and re-raises on error.
+    """
+    global _CONN
+    if _CONN is not None:
+        return _CONN
     try:
-        return sqlite3.connect(DB_PATH, timeout=5)
+        conn = open_db(DB_PATH)
     except sqlite3.Error as e:
         logging.error(f"Database connection error: {e}")
         raise
+    _CONN = conn
+    return conn
+
+@atexit.register
+def close_db_connection() -> None:
+    global _CONN
+    if _CONN is not None:
+        _CONN.close()
+        _CONN = None
 
-def get_last_state(table_name: str, column_name: str) -> Tuple[Optional[int], str]:
+def get_mqtt_transport():
+    """
+    The broker runs on this Pi, so prefer its Unix socket listener and skip the
+    TCP/IP stack. Falls back to TCP when the listener isn't configured.
+    """
+    if os.path.exists(MQTT_SOCKET_PATH):
+        return "unix", MQTT_SOCKET_PATH
+    return "tcp", BROKER_ADDRESS
+
+def on_connect(client, userdata, flags, reason_code, properties):
+    # Nagle would hold these few-byte publishes back waiting on the broker's delayed ACK.
+    # The socket is new on every (re)connect, so the option is set here.
+    sock = client.socket()
+    if sock is not None and sock.family != socket.AF_UNIX:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def get_mqtt_client() -> Optional[mqtt.Client]:
+    """
+    Connects to the local broker so the decided state goes straight to the filter.
+    Returns None if the broker is unreachable; the row is still written to the DB.
+    """
+    transport, broker = get_mqtt_transport()
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, transport=transport)
+    client.on_connect = on_connect
+    client.max_inflight_messages_set(1)
+    try:
+        client.connect(broker, 1883, 60)
+    except Exception as e:
+        logging.error(f"Failed to connect to the MQTT broker: {e}")
+        return None
+    client.loop_start()
+    return client
+
+def publish_filter_state(client: Optional[mqtt.Client], state: str) -> Optional[mqtt.MQTTMessageInfo]:
+    """
+    Publishes 'ON' or 'OFF' to the filter topic as a retained message, so the filter
+    gets the current state as soon as it (re)subscribes. Done before the SQLite
+    insert so the filter reacts without waiting on the commit.
+    """
+    if client is None:
+        return None
+    try:
+        return client.publish(MQTT_TOPIC, state, qos=1, retain=True)
+    except Exception as e:
+        logging.error(f"Error publishing filter_state={state}: {e}")
+        return None
+
+def get_last_state(conn: sqlite3.Connection, table_name: str, column_name: str) -> Tuple[Optional[int], str]:
     """
     Returns (id, state_value) of the most recent entry in the specified table and column.
     If none found, returns (None, "OFF").
     """
-    query = f'SELECT id, {column_name} FROM {table_name} ORDER BY id DESC LIMIT 1'
+    query = LAST_STATE_SQL.get((table_name, column_name))
+    if query is None:
+        logging.error(f"get_last_state: unsupported table/column {table_name}.{column_name}; returning OFF.")
+        return (None, "OFF")
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            result = cursor.fetchone()
-            if not result:
-                logging.info(f"No rows found in {table_name} table; returning OFF as default.")
-                return (None, "OFF")
-            return result
+        result = conn.execute(query).fetchone()
+        if not result:
+            logging.info(f"No rows found in {table_name} table; returning OFF as default.")
+            return (None, "OFF")
+        return result
     except sqlite3.Error as e:
         logging.error(f"Error fetching last_state from {table_name}.{column_name}: {e}")
         return (None, "OFF")
@@ -41,23 +128,35 @@ def get_last_state(table_name: str, column_name: str) -> Tuple[Optional[int], st
         logging.exception(f"Unexpected error in get_last_state: {ex}")
         return (None, "OFF")
 
-def insert_filter_state(state: str) -> None:
+def get_last_states(conn: sqlite3.Connection) -> Tuple[str, str]:
     """
-    Inserts a new row into filter_state with 'ON' or 'OFF' along with a timestamp.
+    Returns (user_state, system_state), the latest user_control and system_control
+    values fetched with a single query. Either defaults to "OFF" if its table is empty
+    or the query fails.
     """
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    query = 'INSERT INTO filter_state (timestamp, filter_state) VALUES (?, ?)'
+    try:
+        user_state, system_state = conn.execute(LAST_STATES_SQL).fetchone()
+        return (user_state or "OFF", system_state or "OFF")
+    except sqlite3.Error as e:
+        logging.error(f"Error fetching last user/system states: {e}")
+        return ("OFF", "OFF")
 
+def insert_filter_state(conn: sqlite3.Connection, state: str) -> bool:
+    """
+    Inserts a new row into filter_state with 'ON' or 'OFF' along with a timestamp.
+    Returns True if the row was written, False if the insert failed.
+    """
+    timestamp = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, (timestamp, state))
-            conn.commit()
-            logging.info(f"Inserted filter_state={state} at {timestamp}")
+        # Autocommit connection: the INSERT is committed as it runs
+        conn.execute(INSERT_FILTER_STATE_SQL, (timestamp, state))
+        logging.info(f"Inserted filter_state={state} at {timestamp}")
+        return True
     except sqlite3.Error as e:
         logging.error(f"Error inserting filter_state={state}: {e}")
     except Exception as ex:
         logging.exception(f"Unexpected error in insert_filter_state: {ex}")
+    return False
 
 
 def main_loop(duration_seconds: int = 59):
@@ -65,22 +164,37 @@ def main_loop(duration_seconds: int = 59):
     Runs a loop for 'duration_seconds' seconds, inserting into the database
     only when there's a change in either the system or user state.
     """
-    start_time = time.time()
+    conn = get_db_connection()
+    client = get_mqtt_client()
+    # Bound once; the loop below runs every second
+    monotonic = time.monotonic
+    sleep = time.sleep
+    end_time = monotonic() + duration_seconds
+    # Only transitions are written; the first tick still publishes so the
+    # retained message matches the table after a restart.
+    last_id, last_written = get_last_state(conn, 'filter_state', 'filter_state')
+    if last_id is None:
+        last_written = None
+    last_published = None
 
-    while time.time() - start_time < duration_seconds:
-        # Get the most recent states
-        _, user_state = get_last_state('user_control', 'user_input')
-        _, system_state = get_last_state('system_control', 'system_input')
+    try:
+        while monotonic() < end_time:
+            # Get the most recent states
+            user_state, system_state = get_last_states(conn)
+            desired = 'ON' if (user_state == 'ON' and system_state == 'ON') else 'OFF'
 
-       
-        if user_state == 'ON' and system_state == 'ON':
-            insert_filter_state('ON')
-        elif user_state == 'ON' and system_state == 'OFF':
-            insert_filter_state('OFF')
-        else:
-            insert_filter_state('OFF')
+            if desired != last_published:
+                publish_filter_state(client, desired)
+                last_published = desired
+            # A failed insert (e.g. database is locked) is retried on the next tick
+            if desired != last_written and insert_filter_state(conn, desired):
+                last_written = desired
 
-        time.sleep(1)
+            sleep(1)
+    finally:
+        if client is not None:
+            client.loop_stop()
+            client.disconnect()
 
 if __name__ == '__main__':
     main_loop(59)
@@ -1,50 +1,57 @@
 import time
 from sps30 import SPS30
-import sqlite3
+from sapphires_db import open_db
 import board
 from adafruit_bme280 import basic as adafruit_bme280
 
 db_path = '/home/Mainhub/SAPPHIRESautomated.db'
 #db_path = '/home/Mainhub/SAPPHIRESmanual.db' #Use this directory if in manual state of study
 
-conn = sqlite3.connect(db_path)
-
-cur = conn.cursor()
+INSERT_INDOOR_SQL = '''
+    INSERT INTO Indoor (timestamp, pm25, temperature, humidity)
+    VALUES (?, ?, ?, ?)
+    '''
 
 sps30 = SPS30(port=1)
 
 i2c = board.I2C()
 bme280 = adafruit_bme280.Adafruit_BME280_I2C(i2c)
 
-def celsius_to_fahrenheit(celsius):
-    return (celsius * 9 / 5) + 32
-
-try:
-    
+def read_pm25():
     sps30.read_measured_values()
-    pm25 = sps30.dict_values['pm2p5']
-    temperature_celsius = bme280.temperature
-    temperature_fahrenheit = celsius_to_fahrenheit(temperature_celsius)
-    humidity = bme280.humidity
+    return sps30.dict_values['pm2p5']
+
+def read_environment():
+    return bme280.temperature, bme280.humidity
+
+def read_indoor():
+    """
+    Reads both sensors and returns (timestamp, pm25, temperature_f, humidity),
+    the parameters for INSERT_INDOOR_SQL.
+    """
+    # Both sensors share I2C bus 1, so their reads can't overlap; read them in turn
+    pm25 = read_pm25()
+    temperature_celsius, humidity = read_environment()
+    temperature_fahrenheit = temperature_celsius * 1.8 + 32.0
     current_time = time.strftime('%Y-%m-%d %H:%M:%S')
+    return (current_time, pm25, temperature_fahrenheit, humidity)
 
-    
-    insert_query = '''
-    INSERT INTO Indoor (timestamp, pm25, temperature, humidity)
-    VALUES (?, ?, ?, ?)
-    '''
-    cur.execute(insert_query, (current_time, pm25, temperature_fahrenheit, humidity))
+def main():
+    conn = open_db(db_path)
+    try:
+        reading = read_indoor()
+        conn.execute(INSERT_INDOOR_SQL, reading)
+
+        print(f"Values inserted successfully at {reading[0]}.")
+
+    except KeyboardInterrupt:
 
-   
-    conn.commit()
+        sps30.stop_measurement()
+        print("\nKeyboard interrupt detected. SPS30 turned off.")
 
-    print(f"Values inserted successfully at {current_time}.")
+    finally:
 
-except KeyboardInterrupt:
-    
-    sps30.stop_measurement()
-    print("\nKeyboard interrupt detected. SPS30 turned off.")
+        conn.close()
 
-finally:
-  
-    conn.close()
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,119 @@
 import paho.mqtt.client as mqtt
+import os
 import time
 import sqlite3
+import threading
 from datetime import datetime
 import ast
+import struct
+from collections import defaultdict, deque
+from sapphires_db import open_db
+
+# orjson parses straight from bytes and is much faster; json is the fallback.
+# Both raise ValueError subclasses on bad input.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 
 LOCAL_MQTT_BROKER = "10.42.0.1"
 LOCAL_MQTT_PORT = 1883
+LOCAL_MQTT_SOCKET_PATH = "/run/mosquitto/mqtt.sock"
 LOCAL_MQTT_TOPICS = ["ZeroW1", "ZeroW2", "ZeroW3", "ZeroW4"]
 
-data_values = {"pm2.5": 0, "Temperature (F)": 0, "Humidity (%)": 0, "Wifi Strength": 0}
-
 
 db_file = 'SAPPHIRESautomated.db' #Choose the right data base needed for stage of stud
 #db_file = 'SAPPHIRESmanual.db'
 
 
-def insert_data(table_name, pm25_value, temperature, humidity, wifi_strength):
-    try:
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
+OUTDOOR_TABLES = ["Outdoor_One", "Outdoor_Two", "Outdoor_Three", "Outdoor_Four"]
+# One fixed INSERT per table so the statement cache reuses it on every flush
+INSERT_SQL = {
+    table: f"INSERT INTO {table} (timestamp, pm25, temperature, humidity, wifi_strength) VALUES (?, ?, ?, ?, ?)"
+    for table in OUTDOOR_TABLES
+}
+
+TOPIC_TO_TABLE = dict(zip(LOCAL_MQTT_TOPICS, OUTDOOR_TABLES))
+
+# Binary node payload: PM2.5, Temperature (F), Humidity (%), Wifi Strength as
+# little-endian float32, 16 bytes. Nodes publish it on their topic plus
+# BINARY_TOPIC_SUFFIX; the length alone can't tell it apart from text, since a
+# JSON payload such as b'{"PM2.5": 12.34}' is also 16 bytes.
+BINARY_PAYLOAD = struct.Struct('<ffff')
+BINARY_TOPIC_SUFFIX = "/bin"
+SUBSCRIBE_TOPICS = LOCAL_MQTT_TOPICS + [topic + BINARY_TOPIC_SUFFIX for topic in LOCAL_MQTT_TOPICS]
 
-        
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+FLUSH_MAX_ROWS = 50
+FLUSH_INTERVAL = 2.0
 
-        
-        query = f'''
-            INSERT INTO {table_name} (timestamp, pm25, temperature, humidity, wifi_strength)
-            VALUES (?, ?, ?, ?, ?)
-        '''
-        cursor.execute(query, (timestamp, pm25_value, temperature, humidity, wifi_strength))
+# Rows waiting to be written: (table_name, timestamp, pm25, temperature, humidity, wifi_strength).
+# on_message runs on paho's network thread and the flush on the main thread, so
+# the queue is only touched under _pending_lock. _flush_now wakes the main
+# thread early when a full batch is waiting.
+_pending = deque()
+_pending_lock = threading.Lock()
+_flush_now = threading.Event()
+_conn = None
 
-        conn.commit()
+
+def insert_data(table_name, pm25_value, temperature, humidity, wifi_strength):
+    """
+    Stamp one reading on arrival and queue it for its table; flush_pending writes
+    the queue in one transaction.
+    """
+    timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
+    with _pending_lock:
+        _pending.append((table_name, timestamp, pm25_value, temperature, humidity, wifi_strength))
+        if len(_pending) >= FLUSH_MAX_ROWS:
+            _flush_now.set()
+
+
+def flush_pending():
+    """
+    Write every queued reading with one executemany per table and a single commit.
+    """
+    global _conn
+    with _pending_lock:
+        if not _pending:
+            return
+        batch = list(_pending)
+        _pending.clear()
+
+    rows_by_table = defaultdict(list)
+    for table_name, *row in batch:
+        rows_by_table[table_name].append(row)
+
+    try:
+        if _conn is None:
+            _conn = open_db(db_file)
+        _conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table_name, rows in rows_by_table.items():
+                _conn.executemany(INSERT_SQL[table_name], rows)
+            _conn.execute("COMMIT")
+        except sqlite3.Error:
+            _conn.execute("ROLLBACK")
+            raise
     except sqlite3.Error as e:
-       
         print(f"SQLite Error: {e}")
-    finally:
-        
-        if 'conn' in locals():
-            conn.close()
+
+
+def parse_payload(raw):
+    """
+    Parse a node's payload bytes into a dict. Nodes are expected to publish JSON,
+    which goes straight to the C parser; payloads still in Python dict repr form
+    (single quotes) fall back to ast.literal_eval.
+    """
+    try:
+        return json_loads(raw)
+    except ValueError:
+        return ast.literal_eval(raw.decode("utf-8").strip())
+
 
 def on_connect(client, userdata, flags, reason_code, properties):
     try:
-        for topic in LOCAL_MQTT_TOPICS:
+        for topic in SUBSCRIBE_TOPICS:
             client.subscribe(topic)
             print(f"Subscribed to topic: {topic}")
     except Exception as e:
@@ -50,79 +121,118 @@ def on_connect(client, userdata, flags, reason_code, properties):
 
 
 
-def on_message(client, userdata, message):
-    global data_values
-    payload = message.payload.decode("utf-8").strip()
-    print(f"Received message: '{payload}'")
-
-    
-    topic_to_table = {
-        "ZeroW1": "Outdoor_One",
-        "ZeroW2": "Outdoor_Two",
-        "ZeroW3": "Outdoor_Three",
-        "ZeroW4": "Outdoor_Four",
-    }
-    table_name = topic_to_table.get(message.topic)
-    if not table_name:
-        print(f"Unknown topic '{message.topic}'")
-        return
-
-    
+def decode_payload(payload, binary=False):
+    """
+    Decode a node's payload bytes into (pm25, temperature, humidity, wifi_strength).
+    binary says the payload came in on a BINARY_TOPIC_SUFFIX topic.
+    Returns None, after printing why, if the payload can't be used.
+    """
+    # Binary payloads decode in one call and are already floats
+    if binary:
+        try:
+            return BINARY_PAYLOAD.unpack(payload)
+        except struct.error as unpack_err:
+            print(f"Error unpacking binary payload: {unpack_err}")
+            return None
+
     try:
-        payload_dict = ast.literal_eval(payload)
-    except (ValueError, SyntaxError) as parse_err:
+        payload_dict = parse_payload(payload)
+    except (ValueError, SyntaxError, UnicodeDecodeError) as parse_err:
         print(f"Error parsing payload: {parse_err}")
-        return
+        return None
 
-    
     try:
-        data_values["pm2.5"] = float(payload_dict.get("PM2.5", 0))
-        data_values["temperature"] = float(payload_dict.get("Temperature (F)", 0))
-        data_values["humidity"] = float(payload_dict.get("Humidity (%)", 0))
-        data_values["Wifi Strength"] = float(payload_dict.get("Wifi Strength", 0))
+        return (
+            float(payload_dict.get("PM2.5", 0)),
+            float(payload_dict.get("Temperature (F)", 0)),
+            float(payload_dict.get("Humidity (%)", 0)),
+            float(payload_dict.get("Wifi Strength", 0)),
+        )
     except ValueError as val_err:
         print(f"Received non-numeric data where a number was expected: {val_err}")
-        return
+        return None
+
+
+def make_message_handler(table_name, store, binary=False):
+    """
+    Returns a paho callback for one node topic. It decodes the payload and passes
+    (table_name, pm25, temperature, humidity, wifi_strength) to store.
+    """
+    def handle_message(client, userdata, message):
+        print(f"Received message: {message.payload!r}")
+        values = decode_payload(message.payload, binary)
+        if values is None:
+            return
+        try:
+            store(table_name, *values)
+        except Exception as db_err:
+            print(f"Unexpected error while inserting data: {db_err}")
+    return handle_message
+
+
+def add_message_handlers(client, store):
+    """
+    Registers one handler per node topic, so paho dispatches each message straight
+    to the handler that already knows its table.
+    """
+    for topic, table_name in TOPIC_TO_TABLE.items():
+        client.message_callback_add(topic, make_message_handler(table_name, store))
+        client.message_callback_add(topic + BINARY_TOPIC_SUFFIX,
+                                    make_message_handler(table_name, store, binary=True))
 
-   
-    try:
-        insert_data(
-            table_name,
-            data_values["pm2.5"],
-            data_values["temperature"],
-            data_values["humidity"],
-            data_values["Wifi Strength"],
-        )
-    except Exception as db_err:
-        print(f"Unexpected error while inserting data: {db_err}")
 
-client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-client.on_connect = on_connect
-client.on_message = on_message
+def on_message(client, userdata, message):
+    # Only reached for topics without a handler from add_message_handlers
+    print(f"Unknown topic '{message.topic}'")
 
 
+def get_mqtt_transport():
+    """
+    The broker runs on this Pi; use its Unix socket listener when it is configured.
+    """
+    if os.path.exists(LOCAL_MQTT_SOCKET_PATH):
+        return "unix", LOCAL_MQTT_SOCKET_PATH
+    return "tcp", LOCAL_MQTT_BROKER
 
-try:
-    client.connect(LOCAL_MQTT_BROKER, LOCAL_MQTT_PORT)
-except Exception as e:
-    print(f"Error connecting to broker '{LOCAL_MQTT_BROKER}': {e}")
-    exit(1)
 
+def main():
+    transport, broker = get_mqtt_transport()
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, transport=transport)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    add_message_handlers(client, insert_data)
 
-for topic in LOCAL_MQTT_TOPICS:
     try:
-        client.subscribe(topic)
+        client.connect(broker, LOCAL_MQTT_PORT)
     except Exception as e:
-        print(f"Error subscribing to topic '{topic}': {e}")
-
-
-start_time = time.time()
-run_duration = 59  
-
+        print(f"Error connecting to broker '{broker}': {e}")
+        exit(1)
 
-while time.time() - start_time < run_duration:
-    client.loop(timeout=1.0)  
-
-
-client.disconnect()
-print("Stopped MQTT client after 59 seconds.")
+    for topic in SUBSCRIBE_TOPICS:
+        try:
+            client.subscribe(topic)
+        except Exception as e:
+            print(f"Error subscribing to topic '{topic}': {e}")
+
+    start_time = time.time()
+    run_duration = 59  
+
+    # paho handles the socket on its own thread; this thread only wakes to flush,
+    # every FLUSH_INTERVAL seconds or as soon as a full batch is queued.
+    client.loop_start()
+    end_time = start_time + run_duration
+    while time.time() < end_time:
+        _flush_now.wait(max(0, min(FLUSH_INTERVAL, end_time - time.time())))
+        _flush_now.clear()
+        flush_pending()
+
+    client.loop_stop()
+    client.disconnect()
+    flush_pending()
+    if _conn is not None:
+        _conn.close()
+    print("Stopped MQTT client after 59 seconds.")
+
+
+if __name__ == '__main__':
+    main()
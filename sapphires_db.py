@@ -0,0 +1,31 @@
+import sqlite3
+
+# Applied to every connection the hub's writer scripts open. WAL lets the
+# dashboards keep reading while a script writes, and synchronous=NORMAL drops
+# the per-commit fsync that dominates write time on the Pi's SD card.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA busy_timeout=5000;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA mmap_size=67108864;"
+    "PRAGMA cache_size=-20000;"
+)
+
+def open_db(path, **kwargs):
+    """
+    Opens the SQLite database at path with the hub's standard pragmas applied.
+    Extra keyword arguments are passed through to sqlite3.connect.
+    The connection is in autocommit mode: each statement commits on its own, and
+    multi-row writes wrap themselves in BEGIN IMMEDIATE ... COMMIT.
+    Raises sqlite3.Error like sqlite3.connect does.
+    """
+    kwargs.setdefault("timeout", 5)
+    kwargs.setdefault("isolation_level", None)
+    conn = sqlite3.connect(path, **kwargs)
+    try:
+        conn.executescript(CONNECTION_PRAGMAS)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
@@ -0,0 +1,190 @@
+import importlib
+import queue
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+import paho.mqtt.client as mqtt
+from sapphires_db import open_db
+import receivedata
+
+DB_PATH = '/home/Mainhub/SAPPHIRESautomated.db'
+#DB_PATH = '/home/Mainhub/SAPPHIRESmanual.db' #Use this directory if in manual state of study
+
+INDOOR_INTERVAL = 60
+WRITE_COALESCE = 1.0
+WRITE_BATCH_MAX = 200
+WRITE_RETRIES = 5
+WRITE_RETRY_DELAY = 0.5
+WRITER_CHECK_INTERVAL = 5
+
+# (sql, params) waiting to be written. The outdoor readings are queued from
+# paho's network thread and the indoor readings from the sensor thread; only
+# the writer thread ever touches the database, so the hub's regular writes never
+# wait on each other's locks. _STOP is queued last, once the producers are done.
+_writes = queue.SimpleQueue()
+_STOP = object()
+
+
+def submit(sql, params):
+    """
+    Queues one INSERT for the writer thread.
+    """
+    _writes.put((sql, params))
+
+
+def _collect_batch():
+    """
+    Blocks for the next write, then keeps collecting for up to WRITE_COALESCE
+    seconds so readings that arrive close together share one commit.
+    """
+    batch = [_writes.get()]
+    deadline = time.monotonic() + WRITE_COALESCE
+    while len(batch) < WRITE_BATCH_MAX and batch[-1] is not _STOP:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(_writes.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_batch(conn, batch):
+    """
+    Writes a batch with one executemany per statement inside a single transaction.
+    """
+    rows_by_sql = defaultdict(list)
+    for sql, params in batch:
+        rows_by_sql[sql].append(params)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for sql, rows in rows_by_sql.items():
+            conn.executemany(sql, rows)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _write_with_retry(conn, batch):
+    """
+    Writes batch, retrying with exponential backoff when SQLite reports a
+    transient error such as "database is locked". Other errors drop the batch.
+    """
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            _write_batch(conn, batch)
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == WRITE_RETRIES:
+                print(f"SQLite Error: {e}; dropping {len(batch)} write(s) after {WRITE_RETRIES} retries.")
+                return
+            delay = WRITE_RETRY_DELAY * 2 ** attempt
+            print(f"SQLite Error: {e}; retrying in {delay:g} s.")
+            time.sleep(delay)
+        except sqlite3.Error as e:
+            print(f"SQLite Error: {e}; dropping {len(batch)} write(s).")
+            return
+
+
+def _writer_loop():
+    conn = open_db(DB_PATH)
+    try:
+        while True:
+            batch = _collect_batch()
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                _write_with_retry(conn, batch)
+            if stop:
+                return
+    finally:
+        conn.close()
+
+
+def queue_outdoor_reading(table_name, *values):
+    """
+    Stamps a decoded node reading and queues it for its Outdoor table.
+    """
+    timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
+    submit(receivedata.INSERT_SQL[table_name], (timestamp, *values))
+
+
+def _indoor_loop(stop_event):
+    """
+    Reads the hub's own sensors every INDOOR_INTERVAL seconds until stop_event is set.
+    """
+    readindoor = None
+    next_read = time.monotonic()
+    while not stop_event.is_set():
+        try:
+            # readindoor sets up the SPS30 and BME280 when imported. Doing that here
+            # means a sensor fault only costs the indoor readings, and it is retried
+            # on the next interval instead of stopping the outdoor ingestion too.
+            if readindoor is None:
+                readindoor = importlib.import_module("readindoor")
+            submit(readindoor.INSERT_INDOOR_SQL, readindoor.read_indoor())
+        except Exception as e:
+            print(f"Error reading indoor sensors: {e}")
+        next_read += INDOOR_INTERVAL
+        stop_event.wait(max(0, next_read - time.monotonic()))
+
+
+def main():
+    """
+    Runs until SIGTERM or Ctrl-C. Returns 1 if the writer thread dies, so the
+    service exits non-zero and can be restarted instead of queueing readings
+    that will never be written.
+    """
+    exit_code = 0
+    interrupted = False
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    writer = threading.Thread(target=_writer_loop, name="sqlite-writer")
+    writer.start()
+    indoor = threading.Thread(target=_indoor_loop, args=(stop_event,), name="indoor-sensors")
+
+    transport, broker = receivedata.get_mqtt_transport()
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, transport=transport)
+    client.on_connect = receivedata.on_connect
+    client.on_message = receivedata.on_message
+    receivedata.add_message_handlers(client, queue_outdoor_reading)
+    try:
+        # connect_async lets paho keep retrying if the broker isn't up yet at boot;
+        # on_connect subscribes to the node topics on every (re)connect.
+        client.connect_async(broker, receivedata.LOCAL_MQTT_PORT)
+        client.loop_start()
+        indoor.start()
+        while not stop_event.wait(WRITER_CHECK_INTERVAL):
+            if not writer.is_alive():
+                print("SQLite writer thread stopped; shutting down.")
+                exit_code = 1
+                break
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        stop_event.set()
+        if indoor.is_alive():
+            indoor.join()
+        # Only once the indoor thread is done with the sensor
+        readindoor = sys.modules.get("readindoor")
+        if interrupted and readindoor is not None:
+            readindoor.sps30.stop_measurement()
+            print("\nKeyboard interrupt detected. SPS30 turned off.")
+        client.loop_stop()
+        client.disconnect()
+        _writes.put(_STOP)
+        writer.join()
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,30 +1,30 @@
-ximport sqlite3
+import sqlite3
 import random
 import datetime
 import time
+from contextlib import closing
+from sapphires_db import open_db
 
 database = 'SAPPHIREStest.db'
 
 # Helper function to create a database connection
 def get_db_connection():
-    return sqlite3.connect(database, timeout=5)
+    return open_db(database)
 
 # Generate random float values within a range
 def random_float(low, high, decimals=2):
     return round(random.uniform(low, high), decimals)
 
-def insert_indoor_data(cursor):
-    timestamp = datetime.datetime.now()
+def insert_indoor_data(cursor, timestamp):
     pm25 = random_float(0, 150)
     temperature = random_float(60, 85)
     humidity = random_float(30, 60)
     cursor.execute('''
                        INSERT INTO Indoor (timestamp, pm25, temperature, humidity)
                        VALUES (?, ?, ?, ?)
-                   ''', (timestamp.strftime("%Y-%m-%d %H:%M:%S"), pm25, temperature, humidity))
+                   ''', (timestamp, pm25, temperature, humidity))
 
-def insert_outdoor_data(cursor):
-    timestamp = datetime.datetime.now()
+def insert_outdoor_data(cursor, timestamp):
     pm25 = random_float(0, 150)
     temperature = random_float(50, 100)
     humidity = random_float(20, 70)
@@ -32,40 +32,41 @@ def insert_outdoor_data(cursor):
     cursor.execute('''
                     INSERT INTO Outdoor (timestamp, pm25, temperature, humidity, wifi_strength)
                     VALUES (?, ?, ?, ?, ?)
-                ''', (timestamp.strftime("%Y-%m-%d %H:%M:%S"), pm25, temperature, humidity, wifi_strength))
+                ''', (timestamp, pm25, temperature, humidity, wifi_strength))
 
-def insert_system_control(cursor):
-    timestamp = datetime.datetime.now()
-    system_input = 'ON' if timestamp.minute == 30 else 'OFF'
+def insert_system_control(cursor, timestamp, minute):
+    system_input = 'ON' if minute == 30 else 'OFF'
     cursor.execute('''INSERT INTO system_control (timestamp, system_input) VALUES (?, ?)''', 
-                   (timestamp.strftime("%Y-%m-%d %H:%M:%S"), system_input))
+                   (timestamp, system_input))
 
-def insert_baseline_value(cursor):
+def insert_baseline_value(cursor, timestamp):
     baseline = 10
-    timestamp = datetime.datetime.now()
     cursor.execute('''
                         INSERT INTO baseline (timestamp, baseline_value)
                         VALUES (?, ?)
-                    ''', (timestamp.strftime("%Y-%m-%d %H:%M:%S"), baseline))
+                    ''', (timestamp, baseline))
 
 if __name__ == '__main__':
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        insert_baseline_value(cursor)
-        conn.commit()
-        while True:
-            insert_indoor_data(cursor)
-            insert_outdoor_data(cursor)
-            insert_system_control(cursor)
-            conn.commit()
-            time.sleep(30)
+        with closing(get_db_connection()) as conn:
+            cursor = conn.cursor()
+            insert_baseline_value(cursor, datetime.datetime.now().isoformat(sep=" ", timespec="seconds"))
+            now_fn = datetime.datetime.now
+            sleep = time.sleep
+            while True:
+                # One timestamp per tick, shared by all three rows, and one write
+                # transaction taken up front so the tick commits with a single fsync
+                now = now_fn()
+                timestamp = now.isoformat(sep=" ", timespec="seconds")
+                cursor.execute("BEGIN IMMEDIATE")
+                insert_indoor_data(cursor, timestamp)
+                insert_outdoor_data(cursor, timestamp)
+                insert_system_control(cursor, timestamp, now.minute)
+                cursor.execute("COMMIT")
+                sleep(30)
     except KeyboardInterrupt:
         print("Terminating the script.")
     except sqlite3.Error as e:
         print(f"Database error: {e}")
     except Exception as e:
         print(f"Unexpected error: {e}")
-    finally:
-        if conn:
-            conn.close()